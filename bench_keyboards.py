@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк кэша клавиатур
+
+Сравнивает построение клавиатуры с нуля (функция под lru_cache,
+вызванная через __wrapped__) и выдачу из кэша: время и выделенная
+память на вызов (tracemalloc). Входы — как у живого бота: календарь
+на 90 дней с числом окон, сетка слотов дня, месяц в админке.
+
+Запуск: python bench_keyboards.py [вызовов]
+"""
+
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from keyboards import booking, main
+
+CALLS = 2000
+
+
+def cases():
+    start = date.today()
+    dates = [(start + timedelta(days=i)).isoformat() for i in range(90)]
+    counts = {d: i % 9 + 1 for i, d in enumerate(dates)}
+    grid = booking.get_slot_grid()
+    free = grid.times[::2]
+    selected = dates[:20]
+    week = tuple(dates[7:14])
+    return [
+        ("main_menu_kb", main.main_menu_kb.__wrapped__, main.main_menu_kb),
+        ("admin_menu_kb", main.admin_menu_kb.__wrapped__, main.admin_menu_kb),
+        ("halls_kb", main.halls_kb.__wrapped__, main.halls_kb),
+        ("calendar_kb", lambda: booking._calendar_week_kb.__wrapped__(
+            week, tuple(counts[d] for d in week), 1, True, True),
+         lambda: booking.calendar_kb(dates, 1, nearest=True, counts=counts)),
+        ("slots_kb", lambda: booking._slots_kb.__wrapped__(grid.mask(free), dates[0]),
+         lambda: booking.slots_kb(free, dates[0])),
+        ("add_day_calendar_kb", lambda: booking._month_kb.__wrapped__(
+            start.year, start.month, frozenset(selected), start),
+         lambda: booking.add_day_calendar_kb(selected)),
+    ]
+
+
+def measure(fn, calls):
+    """(секунд на вызов, байт на вызов) — память по удержанным результатам"""
+    fn()  # прогрев (и заполнение кэша)
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    elapsed = (time.perf_counter() - t0) / calls
+
+    results = [None] * calls
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for i in range(calls):
+        results[i] = fn()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, (after - before) / calls
+
+
+def run():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else CALLS
+    print(f"{'клавиатура':<22}{'без кэша, мкс':>15}{'кэш, мкс':>10}{'быстрее':>9}"
+          f"{'без кэша, Б/вызов':>19}{'кэш, Б/вызов':>14}")
+    for name, build, cached in cases():
+        t_build, mem_build = measure(build, calls)
+        t_cached, mem_cached = measure(cached, calls)
+        print(f"{name:<22}{t_build * 1e6:>15.1f}{t_cached * 1e6:>10.2f}{t_build / t_cached:>8.0f}x"
+              f"{mem_build:>19.0f}{mem_cached:>14.0f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк планировщика напоминаний
+
+Сравнивает прежнюю схему ReminderScheduler (задача APScheduler с
+DateTrigger на каждую запись) с колесом таймеров utils/timing_wheel.py:
+вставка, отмена 10% и срабатывание всех, плюс пиковая память.
+Сроки равномерно разбросаны по ближайшим 24 часам.
+
+Срабатывание для обоих меряется одинаково — посекундными тиками за
+сутки, как работает живой цикл: колесо — advance() на каждую секунду,
+APScheduler — get_due_jobs() и удаление сработавших задач из хранилища
+(так его планировщик снимает отработавший DateTrigger).
+
+APScheduler держит задачи в отсортированном списке (вставка O(n)),
+поэтому по умолчанию меряется только до 100k; --full — до 1M.
+
+Запуск: python bench_reminders.py [--full]
+"""
+
+import asyncio
+import random
+import sys
+import time
+import tracemalloc
+
+from utils.timing_wheel import TimingWheel
+
+SIZES = [10_000, 100_000, 1_000_000]
+APSCHEDULER_MAX = 100_000
+DAY = 24 * 3600
+
+
+def make_dues(n, now):
+    rnd = random.Random(n)
+    return [now + rnd.uniform(60, DAY) for _ in range(n)]
+
+
+def bench_wheel(dues, now):
+    wheel = TimingWheel(now)
+    t0 = time.perf_counter()
+    for bid, due in enumerate(dues):
+        wheel.insert(bid, due)
+    t_insert = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for bid in range(0, len(dues), 10):
+        wheel.cancel(bid)
+    t_cancel = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    fired = 0
+    for tick in range(1, DAY + 2):
+        fired += len(wheel.advance(now + tick))
+    t_fire = time.perf_counter() - t0
+    assert fired == len(dues) - len(range(0, len(dues), 10))
+    return t_insert, t_cancel, t_fire
+
+
+async def _bench_apscheduler(dues, now):
+    from datetime import datetime
+    import pytz
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+    from apscheduler.triggers.date import DateTrigger
+
+    async def send():
+        pass
+
+    scheduler = AsyncIOScheduler(timezone=pytz.utc)
+    scheduler.start(paused=True)
+    t0 = time.perf_counter()
+    for bid, due in enumerate(dues):
+        scheduler.add_job(send, trigger=DateTrigger(run_date=datetime.fromtimestamp(due, pytz.utc)),
+                          id=f"rem_{bid}", replace_existing=True)
+    t_insert = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for bid in range(0, len(dues), 10):
+        scheduler.remove_job(f"rem_{bid}")
+    t_cancel = time.perf_counter() - t0
+
+    # Срабатывание: тик за тиком выбрать наступившие задачи и снять их
+    store = scheduler._lookup_jobstore("default")
+    t0 = time.perf_counter()
+    fired = 0
+    for tick in range(1, DAY + 2):
+        for job in store.get_due_jobs(datetime.fromtimestamp(now + tick, pytz.utc)):
+            store.remove_job(job.id)
+            fired += 1
+    t_fire = time.perf_counter() - t0
+    assert fired == len(dues) - len(range(0, len(dues), 10))
+    scheduler.shutdown(wait=False)
+    return t_insert, t_cancel, t_fire
+
+
+def bench_apscheduler(dues, now):
+    return asyncio.run(_bench_apscheduler(dues, now))
+
+
+def peak_memory(fn, dues, now):
+    tracemalloc.start()
+    fn(dues, now)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def report(name, n, dues, now, fn):
+    t_insert, t_cancel, t_fire = fn(dues, now)
+    peak = peak_memory(fn, dues, now)
+    cancels = len(range(0, n, 10))
+    print(
+        f"{name:<12} {n:>9,}  "
+        f"вставка {t_insert / n * 1e6:7.2f} мкс  "
+        f"отмена {t_cancel / cancels * 1e6:7.2f} мкс  "
+        f"срабатывание {t_fire:7.2f} с  "
+        f"память {peak / 2**20:8.1f} МБ"
+    )
+
+
+def main():
+    full = "--full" in sys.argv
+    try:
+        import apscheduler  # noqa: F401
+        has_apscheduler = True
+    except ImportError:
+        has_apscheduler = False
+        print("APScheduler не установлен — меряем только колесо таймеров")
+
+    now = time.time()
+    for n in SIZES:
+        dues = make_dues(n, now)
+        report("TimingWheel", n, dues, now, bench_wheel)
+        if has_apscheduler:
+            if n <= APSCHEDULER_MAX or full:
+                report("APScheduler", n, dues, now, bench_apscheduler)
+            else:
+                print(f"APScheduler  {n:>9,}  пропущено (запустите с --full)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,44 +2,51 @@
 import asyncio
 import logging
 import os
-from aiogram import Bot, Dispatcher, types
+import sys
+from datetime import timedelta
+from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
+from aiogram.fsm.storage.memory import MemoryStorage
 from config.settings import get_settings
 from database.db import Database
+from database.fsm import SQLiteStorage
 from utils.scheduler import ReminderScheduler
+from utils.subscription import SubscriptionCache
+from utils.sender import SendQueue
+from utils.outbox import OutboxRelay
+from utils.webhook import WebhookServer
+from utils.workers import Supervisor, WorkerLink
+from utils import metrics
+from utils.logs import setup_logging, parse_sample, context_middleware
 from keyboards.main import subscription_kb
 from handlers import user, admin, callbacks, admin_slots
 
 settings = get_settings()
 
-# Настройка логирования
-log_file = os.path.join(os.path.dirname(__file__), "bot.log")
 
-# Очищаем все handlers
-logging.getLogger().handlers = []
+async def open_storage(db):
+    """FSM-хранилище по настройке FSM_STORAGE"""
+    if settings["FSM_STORAGE"] != "sqlite":
+        return MemoryStorage()
+    storage = SQLiteStorage(
+        db,
+        cache_size=settings["FSM_CACHE_SIZE"],
+        flush_interval=settings["FSM_FLUSH_INTERVAL"],
+        ttl=settings["FSM_TTL_HOURS"] * 3600,
+    )
+    await storage.start()
+    return storage
 
-file_handler = logging.FileHandler(log_file, mode='w', encoding='utf-8')
-file_handler.setLevel(logging.INFO)
-file_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
 
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-console_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
-
-logging.getLogger().addHandler(file_handler)
-logging.getLogger().addHandler(console_handler)
-logging.getLogger().setLevel(logging.INFO)
-
-async def main():
-    bot = Bot(token=settings["BOT_TOKEN"], default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-    dp = Dispatcher()
-
-    db = Database(settings["DB_PATH"])
-    await db.init()
-
-    scheduler = ReminderScheduler(bot, db)
-    await scheduler.start()
+def setup_dispatcher(dp, bot, db, scheduler, subscriptions, sender, outbox):
+    """Middleware и роутеры; одинаково для одного процесса и для воркера"""
+    dp.update.outer_middleware(context_middleware)
+    metrics.setup(dp, bot)
+    caches = {"catalog": db.catalog, "availability": db.availability, "subscription": subscriptions}
+    if isinstance(dp.storage, SQLiteStorage):
+        caches["fsm"] = dp.storage
+    metrics.cache_metrics(caches)
 
     # Middleware для проверки подписки и инъекции зависимостей
     @dp.update.outer_middleware
@@ -47,56 +54,44 @@ async def main():
         data["db"] = db
         data["scheduler"] = scheduler
         data["bot"] = bot  # Добавляем bot в data
+        data["subscriptions"] = subscriptions
+        data["sender"] = sender
+        data["outbox"] = outbox
+
+        # event здесь — Update; пользователя кладёт UserContextMiddleware
+        user = data.get("event_from_user")
+        user_id = user.id if user else None
+        message = event.message
+        callback = event.callback_query
 
-        user_id = event.from_user.id if hasattr(event, 'from_user') else None
-        
         # Пропускаем админов
         if user_id in settings["ADMIN_IDS"]:
             return await handler(event, data)
         
         # Пропускаем проверку подписки и ЧС для некоторых команд
-        if isinstance(event, types.CallbackQuery) and event.data == "check_sub":
+        if callback and callback.data == "check_sub":
             return await handler(event, data)
         
-        # Проверка на ЧС
+        # Проверка на ЧС (из памяти)
         if user_id:
             blacklisted = await db.is_blacklisted(user_id)
             if blacklisted:
                 # Блокируем всё кроме /start и /help
-                if isinstance(event, types.Message):
-                    if event.text in ["/start", "/help"]:
-                        return await handler(event, data)
-                    # Игнорируем все остальные сообщения
-                    return
-                elif isinstance(event, types.CallbackQuery):
-                    # Блокируем все callback кроме check_sub
-                    if event.data == "check_sub":
-                        return await handler(event, data)
-                    # Игнорируем
-                    return
+                if message and message.text in ["/start", "/help"]:
+                    return await handler(event, data)
+                # Игнорируем все остальные сообщения и callback
+                return
 
-        # Проверка подписки
-        if settings["CHANNEL_ID"]:
-            try:
-                member = await bot.get_chat_member(settings["CHANNEL_ID"], user_id)
-                if member.status not in ["member", "administrator", "creator"]:
-                    kb = subscription_kb()
-                    text = "🔔 <b>Для записи подпишитесь на канал</b>\n\nНажмите кнопку ниже:"
-                    if isinstance(event, types.Message):
-                        await event.answer(text, reply_markup=kb, parse_mode="HTML")
-                        return
-                    elif isinstance(event, types.CallbackQuery):
-                        await event.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
-                        return
-            except Exception as e:
-                logging.warning(f"Subscription check error: {e}")
+        # Проверка подписки (через кэш)
+        if settings["CHANNEL_ID"] and user_id:
+            if not await subscriptions.is_subscribed(bot, user_id):
                 kb = subscription_kb()
                 text = "🔔 <b>Для записи подпишитесь на канал</b>\n\nНажмите кнопку ниже:"
-                if isinstance(event, types.Message):
-                    await event.answer(text, reply_markup=kb, parse_mode="HTML")
+                if message:
+                    await message.answer(text, reply_markup=kb, parse_mode="HTML")
                     return
-                elif isinstance(event, types.CallbackQuery):
-                    await event.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
+                elif callback:
+                    await callback.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
                     return
 
         return await handler(event, data)
@@ -106,14 +101,175 @@ async def main():
     dp.include_router(callbacks.router)
     dp.include_router(admin_slots.router)
 
+
+def make_subscriptions():
+    return SubscriptionCache(
+        settings["CHANNEL_ID"],
+        positive_ttl=settings["SUB_CACHE_TTL"],
+        negative_ttl=settings["SUB_CACHE_NEGATIVE_TTL"],
+    )
+
+
+async def start_metrics(port: int):
+    """/metrics на METRICS_HOST:port; None, если METRICS_PORT не задан"""
+    if not settings["METRICS_PORT"]:
+        return None
+    return await metrics.serve(settings["METRICS_HOST"], port)
+
+
+async def run_worker(index: int):
+    """Процесс-воркер: апдейты приходят от супервизора (utils/workers.py)"""
+    bot = Bot(token=settings["BOT_TOKEN"], default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    db = Database(settings["DB_PATH"])
+    link = WorkerLink(index, db, concurrency=settings["WORKER_CONCURRENCY"])
+    await link.open()
+    await db.attach()
+
+    storage = await open_storage(db)
+    dp = Dispatcher(storage=storage)
+    setup_dispatcher(dp, bot, db, link.scheduler, make_subscriptions(), link.sender, link.outbox)
+    metrics.component_metrics(pool=db.pool)
+    # Каждый воркер — отдельная цель для Prometheus: METRICS_PORT + 1 + index
+    metrics_runner = await start_metrics(settings["METRICS_PORT"] + 1 + index)
+
+    def stats():
+        fsm = storage.stats() if isinstance(storage, SQLiteStorage) else {}
+        return {"fsm": fsm, "pool": db.pool_stats()}
+
+    try:
+        await link.serve(dp, bot, stats)
+    finally:
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await storage.close()
+        await db.close()
+        await bot.session.close()
+
+
+async def main():
+    bot = Bot(token=settings["BOT_TOKEN"], default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+
+    db = Database(settings["DB_PATH"])
+    await db.init()
+
+    sender = SendQueue(
+        bot,
+        global_rate=settings["SEND_GLOBAL_RATE"],
+        chat_rate=settings["SEND_CHAT_RATE"],
+        group_rate=settings["SEND_GROUP_RATE"],
+        workers=settings["SEND_WORKERS"],
+        max_retries=settings["SEND_MAX_RETRIES"],
+        max_size=settings["SEND_QUEUE_SIZE"],
+    )
+    await sender.start()
+
+    outbox = OutboxRelay(
+        db, sender,
+        interval=settings["OUTBOX_INTERVAL"],
+        max_attempts=settings["OUTBOX_MAX_ATTEMPTS"],
+    )
+    await outbox.start()
+
+    scheduler = ReminderScheduler(
+        bot, db, sender,
+        interval=settings["REMINDER_INTERVAL"],
+        batch=settings["REMINDER_BATCH"],
+        lease=settings["REMINDER_LEASE"],
+        max_attempts=settings["REMINDER_MAX_ATTEMPTS"],
+        catch_up=settings["REMINDER_CATCH_UP"],
+        grace=timedelta(hours=settings["REMINDER_GRACE_HOURS"]),
+        horizon=settings["REMINDER_HORIZON_HOURS"] * 3600,
+        window=settings["REMINDER_WINDOW"],
+        rate=settings["REMINDER_RATE"],
+    )
+    await scheduler.start()
+
+    supervisor = None
+    if settings["BOT_WORKERS"] > 1:
+        # Супервизор: апдейты уходят воркерам, здесь только напоминания и отправка
+        supervisor = Supervisor(
+            settings["BOT_WORKERS"],
+            [sys.executable, os.path.abspath(__file__), "--worker"],
+            db, scheduler, outbox, sender,
+            health_interval=settings["WORKER_HEALTH_INTERVAL"],
+        )
+        await supervisor.start()
+        storage = MemoryStorage()
+        dp = Dispatcher(storage=storage)
+        dp.update.outer_middleware(context_middleware)
+        metrics.setup(dp, bot)
+        metrics.cache_metrics({"catalog": db.catalog})
+
+        @dp.update.outer_middleware
+        async def route_update(handler, event, data):
+            user = data.get("event_from_user")
+            chat = data.get("event_chat")
+            key = user.id if user else chat.id if chat else event.update_id
+            await supervisor.route(key, event)
+
+        # Роутеры — только чтобы allowed_updates совпадали с воркерами
+        for router in (user.router, admin.router, callbacks.router, admin_slots.router):
+            dp.include_router(router)
+    else:
+        storage = await open_storage(db)
+        dp = Dispatcher(storage=storage)
+        setup_dispatcher(dp, bot, db, scheduler, make_subscriptions(), sender, outbox)
+
+    metrics.component_metrics(scheduler=scheduler, sender=sender, supervisor=supervisor, pool=db.pool)
+    metrics_runner = await start_metrics(settings["METRICS_PORT"])
+
     logging.info("🚀 BeautyBot Lite запущен!")
-    await dp.start_polling(bot)
+    try:
+        if settings["BOT_MODE"] == "webhook":
+            server = WebhookServer(
+                dp, bot,
+                path=settings["WEBHOOK_PATH"],
+                secret=settings["WEBHOOK_SECRET"],
+                max_concurrency=settings["WEBHOOK_MAX_CONCURRENCY"],
+                max_pending=settings["WEBHOOK_MAX_PENDING"],
+            )
+            await server.run(settings["WEBHOOK_HOST"], settings["WEBHOOK_PORT"], settings["WEBHOOK_URL"])
+        else:
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        if supervisor:
+            await supervisor.stop()
+        await scheduler.stop()
+        await outbox.stop()
+        await sender.stop()
+        await storage.close()
+        await db.close()
+        await bot.session.close()
+
+def start_logging(worker: int = None):
+    """Логирование через очередь; у каждого воркера свой файл (ротация не делится)"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), settings["LOG_FILE"])
+    if worker is not None:
+        root, ext = os.path.splitext(path)
+        path = f"{root}.worker{worker}{ext}"
+    return setup_logging(
+        path,
+        level=settings["LOG_LEVEL"],
+        fmt=settings["LOG_FORMAT"],
+        max_bytes=settings["LOG_MAX_BYTES"],
+        backups=settings["LOG_BACKUPS"],
+        sample=parse_sample(settings["LOG_SAMPLE"]),
+        queue_size=settings["LOG_QUEUE_SIZE"],
+    )
 
-    scheduler.shutdown()
-    await bot.session.close()
 
 if __name__ == "__main__":
+    worker = int(sys.argv[sys.argv.index("--worker") + 1]) if "--worker" in sys.argv else None
+    listener = start_logging(worker)
     try:
-        asyncio.run(main())
+        if worker is not None:
+            asyncio.run(run_worker(worker))
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         logging.info("🛑 Остановлен")
+    finally:
+        listener.stop()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка планов запросов (EXPLAIN QUERY PLAN)
+
+Собирает все SQL-строки из database/ и handlers/, прогоняет их через
+EXPLAIN QUERY PLAN на свежей базе (схема + индексы из Database.init())
+и падает с кодом 1, если какой-то запрос делает полный проход таблицы.
+
+Запуск: python check_query_plans.py
+"""
+
+import ast
+import asyncio
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from database.db import Database  # noqa: E402
+
+SOURCES = ["database", "handlers"]
+
+# Таблицы, которые намеренно читаются целиком: крошечные справочники,
+# загружаемые в память один раз (кэш каталога, чёрный список),
+# и сводка отзывов — не больше пяти строк на зал
+ALLOWED_FULL_SCANS = {"halls", "masters", "services", "master_prices", "reminder_plans", "blacklist",
+                      "review_stats"}
+
+# Разовые миграции помечают запрос этим комментарием
+FULL_SCAN_MARKER = "-- plan: full scan"
+
+SQL_START = re.compile(r"^\s*(SELECT|UPDATE|DELETE|INSERT|WITH)\b", re.IGNORECASE)
+FULL_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+
+
+def collect_queries():
+    """Все строковые литералы, похожие на SQL: [(файл, строка, sql)]"""
+    queries = []
+    for folder in SOURCES:
+        for name in sorted(os.listdir(os.path.join(ROOT, folder))):
+            if not name.endswith(".py"):
+                continue
+            path = os.path.join(folder, name)
+            with open(os.path.join(ROOT, path), encoding="utf-8") as f:
+                tree = ast.parse(f.read())
+            for node in ast.walk(tree):
+                if isinstance(node, ast.Constant) and isinstance(node.value, str):
+                    if SQL_START.match(node.value):
+                        queries.append((path, node.lineno, node.value))
+    return queries
+
+
+def check(conn, queries):
+    failures = []
+    for path, line, sql in queries:
+        if FULL_SCAN_MARKER in sql:
+            continue
+        params = (None,) * sql.count("?")
+        try:
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        except sqlite3.Error as e:
+            failures.append((path, line, sql, f"ошибка: {e}"))
+            continue
+        for row in plan:
+            detail = row[-1]
+            m = FULL_SCAN.match(detail)
+            if m and m.group(1) not in ALLOWED_FULL_SCANS:
+                failures.append((path, line, sql, detail))
+    return failures
+
+
+async def build_schema(path):
+    db = Database(path)
+    await db.init()
+    await db.close()
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "plans.db")
+        asyncio.run(build_schema(path))
+        conn = sqlite3.connect(path)
+        queries = collect_queries()
+        failures = check(conn, queries)
+        conn.close()
+
+    print(f"Проверено запросов: {len(queries)}")
+    if not failures:
+        print("✅ Полных проходов таблиц нет")
+        return 0
+
+    for path, line, sql, detail in failures:
+        one_line = " ".join(sql.split())
+        print(f"❌ {path}:{line}: {detail}\n   {one_line[:150]}")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,6 +11,16 @@ def get_settings():
         # Bot
         "BOT_TOKEN": os.getenv("BOT_TOKEN", ""),
         "ADMIN_IDS": list(map(int, os.getenv("ADMIN_IDS", "0").split(","))),
+        "BOT_MODE": os.getenv("BOT_MODE", "polling"),  # polling | webhook
+
+        # Webhook
+        "WEBHOOK_URL": os.getenv("WEBHOOK_URL", ""),  # публичный адрес, пусто — set_webhook не вызываем
+        "WEBHOOK_PATH": os.getenv("WEBHOOK_PATH", "/webhook"),
+        "WEBHOOK_SECRET": os.getenv("WEBHOOK_SECRET", ""),
+        "WEBHOOK_HOST": os.getenv("WEBHOOK_HOST", "127.0.0.1"),
+        "WEBHOOK_PORT": int(os.getenv("WEBHOOK_PORT", "8080")),
+        "WEBHOOK_MAX_CONCURRENCY": int(os.getenv("WEBHOOK_MAX_CONCURRENCY", "32")),
+        "WEBHOOK_MAX_PENDING": int(os.getenv("WEBHOOK_MAX_PENDING", "256")),
 
         # Branding (white-label)
         "SALON_NAME": os.getenv("SALON_NAME", "Салон красоты"),
@@ -21,13 +31,74 @@ def get_settings():
         # Channel
         "CHANNEL_ID": os.getenv("CHANNEL_ID", ""),
         "CHANNEL_LINK": os.getenv("CHANNEL_LINK", ""),
+        "SUB_CACHE_TTL": float(os.getenv("SUB_CACHE_TTL", "600")),
+        "SUB_CACHE_NEGATIVE_TTL": float(os.getenv("SUB_CACHE_NEGATIVE_TTL", "15")),
 
         # Database
         "DB_PATH": os.getenv("DB_PATH", "nail_bot.db"),
+        "DB_POOL_SIZE": int(os.getenv("DB_POOL_SIZE", "4")),
+        "DB_BUSY_TIMEOUT": int(os.getenv("DB_BUSY_TIMEOUT", "5000")),
+        "DB_CACHE_SIZE": int(os.getenv("DB_CACHE_SIZE", "-8000")),
 
         # Time
         "TIMEZONE": os.getenv("TIMEZONE", "Europe/Moscow"),
 
+        # Slots
+        "SLOT_STORAGE": os.getenv("SLOT_STORAGE", "rows"),  # rows | bitmap
+        "SLOT_GRANULARITY": int(os.getenv("SLOT_GRANULARITY", "60")),  # минуты
+        "SLOT_DAY_START": os.getenv("SLOT_DAY_START", "10:00"),
+        "SLOT_DAY_END": os.getenv("SLOT_DAY_END", "20:00"),
+
+        # Outgoing messages (лимиты Telegram)
+        "SEND_GLOBAL_RATE": float(os.getenv("SEND_GLOBAL_RATE", "25")),  # сообщений в секунду на бота
+        "SEND_CHAT_RATE": float(os.getenv("SEND_CHAT_RATE", "1")),  # в секунду в личный чат
+        "SEND_GROUP_RATE": float(os.getenv("SEND_GROUP_RATE", "0.33")),  # в секунду в группу/канал
+        "SEND_WORKERS": int(os.getenv("SEND_WORKERS", "4")),
+        "SEND_MAX_RETRIES": int(os.getenv("SEND_MAX_RETRIES", "5")),
+        "SEND_QUEUE_SIZE": int(os.getenv("SEND_QUEUE_SIZE", "10000")),
+
+        # Outbox уведомлений о записях
+        "OUTBOX_INTERVAL": float(os.getenv("OUTBOX_INTERVAL", "5")),  # секунд между опросами
+        "OUTBOX_MAX_ATTEMPTS": int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10")),
+
+        # Workers: больше 1 — супервизор и N процессов, апдейты по user_id
+        "BOT_WORKERS": int(os.getenv("BOT_WORKERS", "1")),
+        "WORKER_CONCURRENCY": int(os.getenv("WORKER_CONCURRENCY", "64")),  # апдейтов одновременно на воркер
+        "WORKER_HEALTH_INTERVAL": float(os.getenv("WORKER_HEALTH_INTERVAL", "30")),  # секунд между ping
+
+        # Logging: запись через очередь, файл с ротацией по размеру
+        "LOG_FILE": os.getenv("LOG_FILE", "bot.log"),  # относительно папки бота
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "INFO"),
+        "LOG_FORMAT": os.getenv("LOG_FORMAT", "text"),  # text | json (с update_id и user_id)
+        "LOG_MAX_BYTES": int(os.getenv("LOG_MAX_BYTES", str(10 * 2**20))),
+        "LOG_BACKUPS": int(os.getenv("LOG_BACKUPS", "5")),
+        # Доля записей ниже WARNING для болтливых логгеров: "handlers.user=0.1,handlers.admin=0.5"
+        "LOG_SAMPLE": os.getenv("LOG_SAMPLE", ""),
+        "LOG_QUEUE_SIZE": int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+
+        # Metrics: /metrics на METRICS_HOST:METRICS_PORT (0 — выключено),
+        # воркеры — на METRICS_PORT + 1 + номер
+        "METRICS_HOST": os.getenv("METRICS_HOST", "127.0.0.1"),
+        "METRICS_PORT": int(os.getenv("METRICS_PORT", "0")),
+
+        # FSM storage
+        "FSM_STORAGE": os.getenv("FSM_STORAGE", "sqlite"),  # sqlite | memory
+        "FSM_CACHE_SIZE": int(os.getenv("FSM_CACHE_SIZE", "10000")),  # сессий в памяти
+        "FSM_FLUSH_INTERVAL": float(os.getenv("FSM_FLUSH_INTERVAL", "1")),  # секунд между сбросами в базу
+        "FSM_TTL_HOURS": float(os.getenv("FSM_TTL_HOURS", "24")),  # через сколько часов простоя сессия забывается
+
         # Reminders
         "REMINDER_TEXT": os.getenv("REMINDER_TEXT", "Напоминаем о записи на {service} завтра в {time}!"),
+        "REMINDER_INTERVAL": float(os.getenv("REMINDER_INTERVAL", "30")),  # максимум секунд между проверками
+        "REMINDER_BATCH": int(os.getenv("REMINDER_BATCH", "100")),
+        "REMINDER_LEASE": int(os.getenv("REMINDER_LEASE", "300")),  # секунд аренды задачи
+        "REMINDER_MAX_ATTEMPTS": int(os.getenv("REMINDER_MAX_ATTEMPTS", "5")),
+        # Досылать пропущенные (например, за время простоя), если опоздали не больше GRACE часов
+        "REMINDER_CATCH_UP": os.getenv("REMINDER_CATCH_UP", "1") == "1",
+        "REMINDER_GRACE_HOURS": float(os.getenv("REMINDER_GRACE_HOURS", "12")),
+        # Сколько часов вперёд держать напоминания в колесе таймеров
+        "REMINDER_HORIZON_HOURS": float(os.getenv("REMINDER_HORIZON_HOURS", "6")),
+        # Окна отправки: раз в WINDOW секунд не больше RATE * WINDOW напоминаний
+        "REMINDER_WINDOW": float(os.getenv("REMINDER_WINDOW", "60")),
+        "REMINDER_RATE": float(os.getenv("REMINDER_RATE", "5")),
     }
@@ -0,0 +1,66 @@
+# database/availability.py
+import asyncio
+
+
+class Availability:
+    """Свободные маски будущих рабочих дней в памяти: {дата: {мастер: маска}}
+
+    Загружается один раз (все открытые дни от сегодня) и дальше
+    поддерживается точечно: каждая запись в расписание пересчитывает
+    свою дату и кладёт результат через put(). Календарь клиента
+    строится из памяти без запросов к time_slots / slot_masks.
+    """
+
+    def __init__(self, loader):
+        self._loader = loader  # async () -> {(дата, мастер): маска}
+        self._days = None
+        self._lock = asyncio.Lock()
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self) -> dict:
+        days = self._days
+        if days is not None:
+            self.hits += 1
+            return days
+
+        async with self._lock:
+            if self._days is not None:
+                self.hits += 1
+                return self._days
+            self.misses += 1
+            version = self.version
+            days = {}
+            for (date, master_id), mask in (await self._loader()).items():
+                days.setdefault(date, {})[master_id] = mask
+            if version == self.version:
+                self._days = days
+            return days
+
+    def put(self, masks: dict, dates=()):
+        """Заменить данные дат свежими масками {(дата, мастер): маска}
+
+        dates — пересчитанные даты: та, где масок не осталось (закрыта,
+        удалена, всё занято), из индекса пропадает.
+        """
+        self.version += 1
+        if self._days is None:
+            return
+        for date in dates:
+            self._days.pop(date, None)
+        for (date, master_id), mask in masks.items():
+            if mask:
+                self._days.setdefault(date, {})[master_id] = mask
+
+    def invalidate(self):
+        """Перечитать всё при следующем обращении"""
+        self.version += 1
+        self._days = None
+
+    def stats(self):
+        return {
+            "dates": len(self._days) if self._days is not None else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
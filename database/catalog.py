@@ -0,0 +1,148 @@
+# database/catalog.py
+import asyncio
+
+
+class CatalogSnapshot:
+    """Снимок справочников: залы, мастера, услуги, планы напоминаний
+
+    Все выборки по id — O(1) из словарей.
+    """
+
+    def __init__(self, version: int, halls: list, masters: list, services: list, plans: list = (),
+                 master_prices: list = ()):
+        self.version = version
+
+        # halls: [(id, name), ...] ORDER BY id
+        self.halls = halls
+        self.hall_names = {hid: name for hid, name in halls}
+
+        # masters: [(id, name, hall_id, is_active), ...]
+        self.master_names = {mid: name for mid, name, _, _ in masters}
+        self.master_halls = {mid: hall_id for mid, _, hall_id, _ in masters}
+        self.masters_by_hall = {}
+        for mid, name, hall_id, is_active in sorted(masters, key=lambda m: m[0]):
+            if is_active:
+                self.masters_by_hall.setdefault(hall_id, []).append((mid, name))
+        self.all_masters = [
+            (mid, name)
+            for mid, name, hall_id, is_active in sorted(masters, key=lambda m: (m[2], m[0]))
+            if is_active
+        ]
+
+        # services: [(id, name, price, duration, hall_id), ...]
+        self.services = {s[0]: s for s in services}
+        self.services_by_hall = {}
+        for svc_id, name, price, duration, hall_id in sorted(services, key=lambda s: s[1]):
+            self.services_by_hall.setdefault(hall_id, []).append((svc_id, name, price, duration))
+
+        # master_prices: [(master_id, service_id, price), ...] — цены мастера вместо цены услуги
+        self.master_prices = {(mid, sid): price for mid, sid, price in master_prices}
+        self.masters_with_prices = {mid for mid, _, _ in master_prices}
+
+        # Отрисованный прайс-лист, заполняется при первом price_list()
+        self._price_list = None
+
+        # plans: [(id, hall_id, service_id, offset_minutes, kind, text), ...]
+        self.plans = {p[0]: p for p in plans}
+        self._plans_by_scope = {}
+        for plan_id, hall_id, service_id, offset, _, _ in sorted(plans, key=lambda p: p[3]):
+            self._plans_by_scope.setdefault((hall_id, service_id), []).append((plan_id, offset))
+
+    def price_for(self, service_id: int, master_id: int = None) -> int:
+        """Цена услуги у мастера: своя, если задана, иначе общая"""
+        price = self.master_prices.get((master_id, service_id))
+        return price if price is not None else self.services[service_id][2]
+
+    def services_for(self, hall_id: int, master_id: int = None) -> list:
+        """Услуги зала [(id, name, price, duration), ...] с ценами мастера"""
+        services = self.services_by_hall.get(hall_id, [])
+        if master_id not in self.masters_with_prices:
+            return services
+        return [(sid, name, self.price_for(sid, master_id), duration) for sid, name, _, duration in services]
+
+    def price_list(self) -> str:
+        """Прайс-лист (HTML); рисуется один раз на снимок
+
+        Общие цены зала — один раз; под ними мастера со своими ценами,
+        только отличающиеся услуги.
+        """
+        if self._price_list is not None:
+            return self._price_list
+        lines = ["<b>💰 Прайс-лист</b>", ""]
+        for hall_id, hall_name in self.halls:
+            lines.append(f"<b>{hall_name}:</b>")
+            services = self.services_by_hall.get(hall_id, [])
+            for svc_id, name, price, duration in services:
+                lines.append(f"  • {name} — {price}₽ ({duration} мин)")
+            for mid, mname in self.masters_by_hall.get(hall_id, []):
+                own = [
+                    (name, self.master_prices[(mid, svc_id)])
+                    for svc_id, name, _, _ in services
+                    if (mid, svc_id) in self.master_prices
+                ]
+                if own:
+                    lines.append(f"  👤 {mname}:")
+                    lines.extend(f"    • {name} — {price}₽" for name, price in own)
+            lines.append("")
+        lines.append("<i>Цены актуальны на момент записи</i>")
+        self._price_list = "\n".join(lines)
+        return self._price_list
+
+    def plans_for(self, hall_id: int, service_id: int) -> list:
+        """Планы напоминаний записи: [(plan_id, offset_minutes), ...]
+
+        Берётся самый точный набор: планы услуги, иначе зала, иначе общие.
+        """
+        for scope in ((hall_id, service_id), (None, service_id), (hall_id, None), (None, None)):
+            plans = self._plans_by_scope.get(scope)
+            if plans:
+                return plans
+        return []
+
+
+class Catalog:
+    """Read-through кэш справочников с версией
+
+    Снимок загружается один раз и отдаётся из памяти до invalidate().
+    """
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._snapshot = None
+        self._lock = asyncio.Lock()
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self.version:
+            self.hits += 1
+            return snapshot
+
+        async with self._lock:
+            # Пока ждали блокировку, снимок мог загрузить другой запрос
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.version == self.version:
+                self.hits += 1
+                return snapshot
+            self.misses += 1
+            version = self.version
+            snapshot = CatalogSnapshot(version, *await self._loader())
+            if version == self.version:
+                self._snapshot = snapshot
+            return snapshot
+
+    def invalidate(self):
+        """Сбросить снимок после изменения справочников"""
+        self.version += 1
+        self._snapshot = None
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0,
+        }
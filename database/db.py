@@ -1,19 +1,104 @@
 # database/db.py
-import aiosqlite
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 import pytz
 from config.settings import get_settings
+from database.pool import ConnectionPool
+from database.catalog import Catalog
+from database.availability import Availability
+from database.slots import get_slot_grid, make_slot_store
+from utils.metrics import DB_CALLS, DB_ERRORS, timed
 
 settings = get_settings()
 tz = pytz.timezone(settings["TIMEZONE"])
 
+# Индексы под горячие запросы
+INDEXES = [
+    # get_bookings_for_date, отчёты за месяц (диапазон дат)
+    "CREATE INDEX IF NOT EXISTS idx_bookings_date_time ON bookings (date, time)",
+    # Сетка слотов мастера и запись в конкретном слоте
+    "CREATE INDEX IF NOT EXISTS idx_bookings_date_master_time ON bookings (date, master_id, time)",
+    # get_user_active_booking
+    "CREATE INDEX IF NOT EXISTS idx_bookings_user_date ON bookings (user_id, date)",
+    # Отчёты и рейтинг по залу
+    "CREATE INDEX IF NOT EXISTS idx_bookings_hall_date ON bookings (hall_id, date)",
+    # claim_due_reminders / get_reminders_between
+    "CREATE INDEX IF NOT EXISTS idx_reminder_tasks_remind_at ON reminder_tasks (remind_at)",
+    # Лента отзывов
+    "CREATE INDEX IF NOT EXISTS idx_reviews_created ON reviews (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_reviews_rating_created ON reviews (rating, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_reviews_user_created ON reviews (user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_reviews_booking ON reviews (booking_id)",
+    # Чёрный список для админки
+    "CREATE INDEX IF NOT EXISTS idx_blacklist_added ON blacklist (added_at)",
+    # Неотправленные уведомления outbox по порядку
+    "CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox (sent_at, id)",
+    # Чистка просроченных FSM-сессий
+    "CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states (updated_at)",
+]
 
+
+# Планы напоминаний по умолчанию: (смещение в минутах от начала визита, вид, текст)
+DEFAULT_REMINDER_PLANS = [
+    (-24 * 60, "reminder", settings["REMINDER_TEXT"]),
+    (-2 * 60, "reminder", "Через 2 часа ждём вас: {service} в {time} 💅"),
+    (3 * 60, "review", "Спасибо, что были у нас! Оцените, пожалуйста, визит — это займёт минуту."),
+]
+
+
+@dataclass
+class BookingResult:
+    """Результат commit_booking"""
+    ok: bool
+    booking_id: int = None
+    reason: str = ""  # "slot_taken" если слот уже занят
+    reminders: list = None  # [(task_id, remind_at), ...] поставленные напоминания
+
+
+# Курсор «до всех отзывов»: первая страница — тот же запрос, что и следующие
+REVIEWS_START = ("9999-12-31", 0)
+
+
+@dataclass
+class ReviewPage:
+    """Страница ленты отзывов (get_reviews_page)"""
+    rows: list
+    newer: tuple = None  # курсор (created_at, id) предыдущей страницы, None — это первая
+    older: tuple = None  # курсор следующей страницы, None — дальше отзывов нет
+
+
+@timed(DB_CALLS, DB_ERRORS)
 class Database:
     def __init__(self, db_path: str):
         self.db_path = db_path
+        self.pool = ConnectionPool(
+            db_path,
+            readers=settings["DB_POOL_SIZE"],
+            busy_timeout=settings["DB_BUSY_TIMEOUT"],
+            cache_size=settings["DB_CACHE_SIZE"],
+        )
+        self.catalog = Catalog(self._load_catalog)
+        # Чёрный список целиком в памяти: user_id -> reason
+        self._blacklist = {}
+        # Хранилище слотов: строки time_slots или битовые маски slot_masks
+        self.grid = get_slot_grid()
+        self.slots = make_slot_store(settings["SLOT_STORAGE"], self.grid)
+        # Свободные маски будущих дней в памяти — для календаря клиента
+        self.availability = Availability(self._load_availability)
+        # Вызывается с "catalog" / "blacklist" / "slots:..." после изменения кэшей в памяти
+        # (воркер передаёт изменение остальным процессам)
+        self.on_change = None
+
+    async def close(self):
+        await self.pool.close()
+
+    def pool_stats(self):
+        """Статистика пула соединений"""
+        return self.pool.stats()
 
     async def init(self):
-        async with aiosqlite.connect(self.db_path) as db:
+        await self.pool.open()
+        async with self.pool.write() as db:
             # Залы
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS halls (
@@ -42,6 +127,17 @@ class Database:
                     FOREIGN KEY (hall_id) REFERENCES halls(id)
                 )
             """)
+            # Цены мастера, отличающиеся от цены услуги
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS master_prices (
+                    master_id INTEGER NOT NULL,
+                    service_id INTEGER NOT NULL,
+                    price INTEGER NOT NULL,
+                    PRIMARY KEY (master_id, service_id),
+                    FOREIGN KEY (master_id) REFERENCES masters(id),
+                    FOREIGN KEY (service_id) REFERENCES services(id)
+                )
+            """)
             # Рабочие дни
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS working_days (
@@ -63,6 +159,17 @@ class Database:
                     FOREIGN KEY (master_id) REFERENCES masters(id)
                 )
             """)
+            # Слоты компактно: одна строка на мастера и день (SLOT_STORAGE=bitmap)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS slot_masks (
+                    date TEXT NOT NULL,
+                    master_id INTEGER NOT NULL,
+                    open_mask INTEGER NOT NULL DEFAULT 0,
+                    booked_mask INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (date, master_id),
+                    FOREIGN KEY (master_id) REFERENCES masters(id)
+                )
+            """)
             # Записи клиентов
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS bookings (
@@ -78,16 +185,58 @@ class Database:
                     master_name TEXT,
                     date TEXT NOT NULL,
                     time TEXT NOT NULL,
+                    duration INTEGER,
                     created_at TEXT DEFAULT CURRENT_TIMESTAMP,
                     reminder_sent INTEGER DEFAULT 0
                 )
             """)
-            # Задачи напоминаний
+            # Старые базы: длительность записи (минуты) для освобождения слотов
+            await self._add_column(db, "bookings", "duration", "INTEGER")
+            # Планы напоминаний: смещение от начала визита в минутах
+            # (отрицательное — до визита); hall_id/service_id NULL — для всех
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS reminder_plans (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    hall_id INTEGER,
+                    service_id INTEGER,
+                    offset_minutes INTEGER NOT NULL,
+                    kind TEXT NOT NULL DEFAULT 'reminder',
+                    text TEXT NOT NULL,
+                    is_active INTEGER DEFAULT 1
+                )
+            """)
+            # Задачи напоминаний: по одной на (запись, план)
+            await self._migrate_reminder_tasks(db)
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS reminder_tasks (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    booking_id INTEGER UNIQUE NOT NULL,
-                    remind_at TEXT NOT NULL
+                    booking_id INTEGER NOT NULL,
+                    plan_id INTEGER,
+                    remind_at TEXT NOT NULL,
+                    attempts INTEGER DEFAULT 0,
+                    claimed_until TEXT,
+                    UNIQUE(booking_id, plan_id)
+                )
+            """)
+            # Outbox уведомлений: пишется в транзакции записи, отправляется OutboxRelay
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chat_id TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    attempts INTEGER DEFAULT 0,
+                    claimed_until TEXT,
+                    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                    sent_at TEXT
+                )
+            """)
+            # Состояния FSM (database/fsm.py): data — JSON, updated_at — unix time
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS fsm_states (
+                    key TEXT PRIMARY KEY,
+                    state TEXT,
+                    data TEXT,
+                    updated_at REAL NOT NULL
                 )
             """)
 
@@ -113,6 +262,23 @@ class Database:
                     FOREIGN KEY (booking_id) REFERENCES bookings(id)
                 )
             """)
+            # Старые базы: зал отзыва (из записи) — запись могут отменить и удалить
+            await self._add_column(db, "reviews", "hall_id", "INTEGER")
+            # Сводка отзывов: сколько оценок каждого балла по залу (0 — без записи),
+            # ведётся в add_review / delete_review
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS review_stats (
+                    hall_id INTEGER NOT NULL,
+                    rating INTEGER NOT NULL,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (hall_id, rating)
+                )
+            """)
+            await self._build_review_stats(db)
+
+            # Индексы под горячие запросы (проверяются check_query_plans.py)
+            for sql in INDEXES:
+                await db.execute(sql)
 
             # Добавим залы по умолчанию
             await db.execute("INSERT OR IGNORE INTO halls (name) VALUES ('Стрижки'), ('Ногти')")
@@ -173,66 +339,211 @@ class Database:
                 WHERE NOT EXISTS (SELECT 1 FROM services WHERE name = 'Дизайн ногтей' AND hall_id = 2)
             """)
 
+            # Планы напоминаний по умолчанию: за сутки, за 2 часа и просьба об отзыве
+            cursor = await db.execute("SELECT 1 FROM reminder_plans LIMIT 1")
+            if not await cursor.fetchone():
+                await db.executemany(
+                    "INSERT INTO reminder_plans (offset_minutes, kind, text) VALUES (?, ?, ?)",
+                    DEFAULT_REMINDER_PLANS
+                )
+
             await db.commit()
+        self.invalidate_catalog()
+        await self._load_blacklist()
+        if self.slots.mode == "bitmap":
+            await self._import_slot_rows()
+        self.availability.invalidate()
 
-    # ===== Halls & Masters & Services =====
-    async def get_halls(self):
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("SELECT id, name FROM halls ORDER BY id")
-            return await cursor.fetchall()
+    async def attach(self):
+        """Подключиться к базе, которую уже подготовил init() другого процесса"""
+        await self.pool.open()
+        self.catalog.invalidate()
+        self.availability.invalidate()
+        await self._load_blacklist()
 
-    async def get_masters_by_hall(self, hall_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "SELECT id, name FROM masters WHERE hall_id = ? AND is_active = 1 ORDER BY id",
-                (hall_id,)
-            )
-            return await cursor.fetchall()
+    def _changed(self, what: str):
+        if self.on_change:
+            self.on_change(what)
 
-    async def get_services_by_hall(self, hall_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "SELECT id, name, price, duration FROM services WHERE hall_id = ? ORDER BY name",
-                (hall_id,)
+    async def apply_change(self, what: str):
+        """Изменение из другого процесса: перечитать свой кэш"""
+        if what == "catalog":
+            self.catalog.invalidate()
+        elif what == "blacklist":
+            await self._load_blacklist()
+        elif what == "slots":
+            self.availability.invalidate()
+        elif what.startswith("slots:"):
+            dates = what[len("slots:"):].split(",")
+            async with self.pool.read() as db:
+                masks = await self.slots.free_masks(db, min(dates), max(dates))
+            self.availability.put(masks, dates)
+
+    @staticmethod
+    async def _add_column(db, table: str, column: str, decl: str):
+        """ALTER TABLE ADD COLUMN, если колонки ещё нет"""
+        cursor = await db.execute(f"PRAGMA table_info({table})")
+        if column not in [r[1] for r in await cursor.fetchall()]:
+            await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+    @staticmethod
+    async def _build_review_stats(db):
+        """Первый запуск со сводкой: посчитать её по уже имеющимся отзывам"""
+        cursor = await db.execute("SELECT 1 FROM review_stats LIMIT 1")
+        if await cursor.fetchone():
+            return
+        await db.execute(
+            """UPDATE reviews SET hall_id = (SELECT hall_id FROM bookings WHERE id = reviews.booking_id)
+               WHERE hall_id IS NULL AND booking_id IS NOT NULL  -- plan: full scan (разовая миграция)"""
+        )
+        await db.execute(
+            """INSERT INTO review_stats (hall_id, rating, count)
+               SELECT COALESCE(hall_id, 0), rating, COUNT(*) FROM reviews
+               GROUP BY COALESCE(hall_id, 0), rating  -- plan: full scan (разовая миграция)"""
+        )
+
+    @staticmethod
+    async def _migrate_reminder_tasks(db):
+        """Старая reminder_tasks (одна задача на запись) → задачи по планам
+
+        SQLite не умеет снимать UNIQUE, поэтому таблица пересоздаётся.
+        Перенесённые задачи остаются без плана — текст REMINDER_TEXT.
+        """
+        cursor = await db.execute("PRAGMA table_info(reminder_tasks)")
+        columns = [r[1] for r in await cursor.fetchall()]
+        if not columns or "plan_id" in columns:
+            return
+        await db.execute("ALTER TABLE reminder_tasks RENAME TO reminder_tasks_old")
+        await db.execute("DROP INDEX IF EXISTS idx_reminder_tasks_remind_at")
+        await db.execute("""
+            CREATE TABLE reminder_tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                booking_id INTEGER NOT NULL,
+                plan_id INTEGER,
+                remind_at TEXT NOT NULL,
+                attempts INTEGER DEFAULT 0,
+                claimed_until TEXT,
+                UNIQUE(booking_id, plan_id)
             )
-            return await cursor.fetchall()
+        """)
+        await db.execute("""
+            INSERT INTO reminder_tasks (booking_id, remind_at)
+            SELECT booking_id, remind_at FROM reminder_tasks_old  -- plan: full scan (разовая миграция)
+        """)
+        await db.execute("DROP TABLE reminder_tasks_old")
 
-    async def get_service(self, service_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
+    async def _import_slot_rows(self):
+        """При первом запуске в режиме bitmap переносим слоты из time_slots"""
+        async with self.pool.write() as db:
+            cursor = await db.execute("SELECT 1 FROM slot_masks LIMIT 1")
+            if await cursor.fetchone():
+                return
+            await db.execute("BEGIN IMMEDIATE")
+            await self.slots.import_rows(db)
+            await db.commit()
+
+    # ===== Halls & Masters & Services =====
+    async def _load_catalog(self):
+        async with self.pool.read() as db:
+            cursor = await db.execute("SELECT id, name FROM halls ORDER BY id")
+            halls = await cursor.fetchall()
+            cursor = await db.execute("SELECT id, name, hall_id, is_active FROM masters")
+            masters = await cursor.fetchall()
+            cursor = await db.execute("SELECT id, name, price, duration, hall_id FROM services")
+            services = await cursor.fetchall()
             cursor = await db.execute(
-                "SELECT id, name, price, duration, hall_id FROM services WHERE id = ?",
-                (service_id,)
+                "SELECT id, hall_id, service_id, offset_minutes, kind, text FROM reminder_plans WHERE is_active = 1"
             )
-            return await cursor.fetchone()
+            plans = await cursor.fetchall()
+            cursor = await db.execute("SELECT master_id, service_id, price FROM master_prices")
+            master_prices = await cursor.fetchall()
+        return halls, masters, services, plans, master_prices
+
+    def invalidate_catalog(self):
+        """Вызывать после любых изменений halls / masters / services"""
+        self.catalog.invalidate()
+        self._changed("catalog")
+
+    def catalog_stats(self):
+        return self.catalog.stats()
+
+    async def get_catalog(self):
+        """Снимок справочников целиком (CatalogSnapshot, с версией)"""
+        return await self.catalog.get()
+
+    async def get_halls(self):
+        return (await self.catalog.get()).halls
+
+    async def get_masters_by_hall(self, hall_id: int):
+        return (await self.catalog.get()).masters_by_hall.get(hall_id, [])
+
+    async def get_services_by_hall(self, hall_id: int, master_id: int = None):
+        """Услуги зала; с master_id — с ценами этого мастера"""
+        return (await self.catalog.get()).services_for(hall_id, master_id)
+
+    async def get_service(self, service_id: int, master_id: int = None):
+        """(id, name, price, duration, hall_id); с master_id — цена мастера"""
+        snapshot = await self.catalog.get()
+        service = snapshot.services.get(service_id)
+        if service and master_id is not None:
+            service = service[:2] + (snapshot.price_for(service_id, master_id),) + service[3:]
+        return service
+
+    async def set_master_price(self, master_id: int, service_id: int, price: int = None):
+        """Своя цена мастера на услугу; price=None — вернуть общую"""
+        async with self.pool.write() as db:
+            if price is None:
+                await db.execute(
+                    "DELETE FROM master_prices WHERE master_id = ? AND service_id = ?",
+                    (master_id, service_id)
+                )
+            else:
+                await db.execute(
+                    """INSERT INTO master_prices (master_id, service_id, price) VALUES (?, ?, ?)
+                       ON CONFLICT(master_id, service_id) DO UPDATE SET price = excluded.price""",
+                    (master_id, service_id, price)
+                )
+            await db.commit()
+        self.invalidate_catalog()
 
     async def get_hall_name(self, hall_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("SELECT name FROM halls WHERE id = ?", (hall_id,))
-            row = await cursor.fetchone()
-            return row[0] if row else ""
+        return (await self.catalog.get()).hall_names.get(hall_id, "")
 
     async def get_master_name(self, master_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("SELECT name FROM masters WHERE id = ?", (master_id,))
-            row = await cursor.fetchone()
-            return row[0] if row else ""
+        return (await self.catalog.get()).master_names.get(master_id, "")
 
     # ===== Working Days =====
     async def add_working_day(self, date: str):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("INSERT OR IGNORE INTO working_days (date) VALUES (?)", (date,))
-            # Авто-слоты 10:00-19:00 для каждого мастера
-            masters = await self.get_all_masters()
-            for master_id, _ in masters:
-                for h in range(10, 20):
-                    await db.execute(
-                        "INSERT OR IGNORE INTO time_slots (date, time, master_id) VALUES (?, ?, ?)",
-                        (date, f"{h:02d}:00", master_id)
-                    )
+        await self.add_working_days([date])
+
+    async def add_working_days(self, dates: list, template: list = None):
+        """Открыть несколько дней разом
+
+        template — список времён слотов (по умолчанию вся сетка дня,
+        см. SLOT_DAY_START / SLOT_DAY_END / SLOT_GRANULARITY), создаётся
+        для каждого активного мастера. Все строки вставляются одним
+        executemany в одной транзакции.
+        Возвращает {дата: сколько слотов добавлено}.
+        """
+        dates = sorted(set(dates))
+        if not dates:
+            return {}
+        template_mask = self.grid.mask(template) if template else self.grid.full_mask
+        masters = await self.get_all_masters()
+
+        async with self.pool.write() as db:
+            await db.execute("BEGIN IMMEDIATE")
+            await db.executemany(
+                "INSERT OR IGNORE INTO working_days (date) VALUES (?)",
+                [(date,) for date in dates]
+            )
+            counts = await self.slots.generate(db, dates, [mid for mid, _ in masters], template_mask)
             await db.commit()
+            await self._refresh_dates(db, dates)
+        return counts
 
     async def close_day(self, date: str, closed: bool = True):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.write() as db:
             await db.execute(
                 "INSERT OR IGNORE INTO working_days (date, is_closed) VALUES (?, ?)",
                 (date, 1 if closed else 0)
@@ -242,18 +553,20 @@ class Database:
                 (1 if closed else 0, date)
             )
             await db.commit()
+            await self._refresh_dates(db, [date])
 
     async def remove_working_day(self, date: str):
         """Полностью удалить рабочий день и все слоты"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.write() as db:
             # Удаляем слоты
-            await db.execute("DELETE FROM time_slots WHERE date = ?", (date,))
+            await self.slots.drop_date(db, date)
             # Удаляем дату из working_days
             await db.execute("DELETE FROM working_days WHERE date = ?", (date,))
             await db.commit()
+            await self._refresh_dates(db, [date])
 
     async def get_working_days(self, days_ahead: int = 30):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.read() as db:
             today = datetime.now(tz).date().isoformat()
             end = (datetime.now(tz) + timedelta(days=days_ahead)).date().isoformat()
             cursor = await db.execute(
@@ -264,61 +577,189 @@ class Database:
 
     # ===== Time Slots =====
     async def add_time_slot(self, date: str, time: str, master_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                "INSERT OR IGNORE INTO time_slots (date, time, master_id) VALUES (?, ?, ?)",
-                (date, time, master_id)
-            )
+        async with self.pool.write() as db:
+            await self.slots.open(db, date, time, master_id)
             await db.commit()
+            await self._refresh_dates(db, [date])
 
     async def remove_time_slot(self, date: str, time: str, master_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                "DELETE FROM time_slots WHERE date = ? AND time = ? AND master_id = ?",
-                (date, time, master_id)
-            )
+        async with self.pool.write() as db:
+            await self.slots.close(db, date, time, master_id)
             await db.commit()
+            await self._refresh_dates(db, [date])
 
-    async def get_available_slots(self, date: str, master_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "SELECT time FROM time_slots WHERE date = ? AND master_id = ? AND is_booked = 0 ORDER BY time",
-                (date, master_id)
-            )
-            return [r[0] for r in await cursor.fetchall()]
+    async def get_available_slots(self, date: str, master_id: int, duration: int = None):
+        """Свободные времена начала; с duration — только те, где услуга
+        помещается целиком и не наезжает на следующую запись"""
+        async with self.pool.read() as db:
+            return await self.slots.free_times(db, date, master_id, self.grid.span(duration))
 
-    async def book_slot(self, date: str, time: str, master_id: int, user_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                "UPDATE time_slots SET is_booked = 1, booked_by = ? WHERE date = ? AND time = ? AND master_id = ? AND is_booked = 0",
-                (user_id, date, time, master_id)
-            )
+    async def book_slot(self, date: str, time: str, master_id: int, user_id: int, duration: int = None):
+        async with self.pool.write() as db:
+            await db.execute("BEGIN IMMEDIATE")
+            if not await self.slots.claim(db, date, time, master_id, user_id, self.grid.span(duration)):
+                await db.rollback()
+                return False
             await db.commit()
-            return db.total_changes > 0
+            await self._refresh_dates(db, [date])
+            return True
 
-    async def release_slot(self, date: str, time: str, master_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                "UPDATE time_slots SET is_booked = 0, booked_by = NULL WHERE date = ? AND time = ? AND master_id = ?",
-                (date, time, master_id)
-            )
+    async def release_slot(self, date: str, time: str, master_id: int, duration: int = None):
+        async with self.pool.write() as db:
+            await self.slots.release(db, date, time, master_id, self.grid.span(duration))
             await db.commit()
+            await self._refresh_dates(db, [date])
+
+    # ===== Индекс свободных дат =====
+    async def _load_availability(self):
+        today = datetime.now(tz).date().isoformat()
+        async with self.pool.read() as db:
+            return await self.slots.free_masks(db, today, "9999-12-31")
+
+    async def _refresh_dates(self, db, dates: list):
+        """Пересчитать даты в индексе после записи в расписание
+
+        Вызывается на соединении записи до его освобождения: следующая
+        запись не успеет положить свой результат раньше нашего.
+        """
+        masks = await self.slots.free_masks(db, min(dates), max(dates))
+        self.availability.put(masks, dates)
+        # Длинный список дат другим процессам дешевле перечитать целиком
+        self._changed("slots:" + ",".join(dates) if len(dates) <= 31 else "slots")
+
+    async def get_bookable_days(self, master_id: int, duration: int = None, days_ahead: int = 90) -> dict:
+        """Даты, где у мастера помещается услуга: {дата: число вариантов начала}
+
+        Считается по индексу в памяти, без запросов к слотам. Даты
+        по возрастанию; сегодня — только начала позже текущего времени.
+        """
+        days = await self.availability.get()
+        span = self.grid.span(duration)
+        now = datetime.now(tz)
+        today = now.date().isoformat()
+        end = (now + timedelta(days=days_ahead)).date().isoformat()
+        later = self.grid.after(now.strftime("%H:%M"))
+
+        result = {}
+        for date in sorted(d for d in days if today <= d <= end):
+            starts = self.grid.starts(days[date].get(master_id, 0), span)
+            if date == today:
+                starts &= later
+            if starts:
+                result[date] = bin(starts).count("1")
+        return result
+
+    async def find_earliest(self, hall_id: int, duration: int = None, limit: int = 5, days_ahead: int = 90):
+        """Ближайшие свободные окна под услугу у всех мастеров зала
+
+        Свободные маски на горизонт days_ahead берутся из индекса в памяти,
+        допустимые начала считаются по маскам.
+        Возвращает [(date, time, master_id, master_name), ...] по возрастанию.
+        """
+        snapshot = await self.catalog.get()
+        masters = snapshot.masters_by_hall.get(hall_id, [])
+        if not masters:
+            return []
+        span = self.grid.span(duration)
+        now = datetime.now(tz)
+        today = now.date().isoformat()
+        end = (now + timedelta(days=days_ahead)).date().isoformat()
+        now_time = now.strftime("%H:%M")
+
+        days = await self.availability.get()
+
+        result = []
+        for date in sorted(d for d in days if today <= d <= end):
+            day = []
+            for master_id, master_name in masters:
+                starts = self.grid.starts(days[date].get(master_id, 0), span)
+                for time in self.grid.times_of(starts):
+                    # Сегодня — только время, которое ещё не прошло
+                    if date == today and time <= now_time:
+                        continue
+                    day.append((date, time, master_id, master_name))
+            day.sort(key=lambda r: r[1])
+            result.extend(day)
+            if len(result) >= limit:
+                break
+        return result[:limit]
+
+    async def clear_schedule(self):
+        """Удалить все записи, слоты и рабочие дни"""
+        async with self.pool.write() as db:
+            await db.execute("DELETE FROM bookings")
+            await db.execute("DELETE FROM reminder_tasks")
+            await self.slots.drop_all(db)
+            await db.execute("DELETE FROM working_days")
+            await db.commit()
+            self.availability.invalidate()
+            self._changed("slots")
 
     async def get_all_masters(self):
         """Получить всех активных мастеров"""
-        async with aiosqlite.connect(self.db_path) as db:
+        return (await self.catalog.get()).all_masters
+
+    # ===== Bookings =====
+    async def commit_booking(self, user_id: int, name: str, phone: str,
+                             service_id: int, service_name: str,
+                             hall_id: int, hall_name: str,
+                             master_id: int, master_name: str,
+                             date: str, time: str,
+                             duration: int = None, notifications: list = None) -> BookingResult:
+        """Занять слот, создать запись и поставить напоминания одной транзакцией
+
+        BEGIN IMMEDIATE сразу берёт блокировку записи, поэтому
+        конкурирующие подтверждения не перемешиваются, а сбой посередине
+        не оставит занятый слот без записи. Услуга длиннее шага сетки
+        занимает все слоты, которые перекрывает. notifications —
+        [(chat_id, text), ...] в outbox той же транзакцией. Напоминания —
+        по планам зала/услуги (reminder_plans), уже прошедшие пропускаются.
+        """
+        snapshot = await self.catalog.get()
+        appt = tz.localize(datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M"))
+        now = datetime.now(tz)
+        reminders = [
+            (plan_id, appt + timedelta(minutes=offset))
+            for plan_id, offset in snapshot.plans_for(hall_id, service_id)
+            if appt + timedelta(minutes=offset) > now
+        ]
+        async with self.pool.write() as db:
+            await db.execute("BEGIN IMMEDIATE")
+            if not await self.slots.claim(db, date, time, master_id, user_id, self.grid.span(duration)):
+                await db.rollback()
+                return BookingResult(ok=False, reason="slot_taken")
+
             cursor = await db.execute(
-                "SELECT id, name FROM masters WHERE is_active = 1 ORDER BY hall_id, id"
+                """INSERT INTO bookings (user_id, name, phone, service_id, service_name,
+                   hall_id, hall_name, master_id, master_name, date, time, duration)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (user_id, name, phone, service_id, service_name, hall_id, hall_name,
+                 master_id, master_name, date, time, duration)
             )
-            return await cursor.fetchall()
+            booking_id = cursor.lastrowid
+
+            tasks = []
+            for plan_id, remind_at in reminders:
+                cursor = await db.execute(
+                    "INSERT INTO reminder_tasks (booking_id, plan_id, remind_at) VALUES (?, ?, ?)",
+                    (booking_id, plan_id, remind_at.isoformat())
+                )
+                tasks.append((cursor.lastrowid, remind_at))
+            if notifications:
+                await db.executemany(
+                    "INSERT INTO outbox (chat_id, text) VALUES (?, ?)",
+                    [(str(chat_id), text) for chat_id, text in notifications]
+                )
+            await db.commit()
+            await self._refresh_dates(db, [date])
+        return BookingResult(ok=True, booking_id=booking_id, reminders=tasks)
 
-    # ===== Bookings =====
     async def create_booking(self, user_id: int, name: str, phone: str,
                             service_id: int, service_name: str,
                             hall_id: int, hall_name: str,
                             master_id: int, master_name: str,
                             date: str, time: str):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.write() as db:
             cursor = await db.execute(
                 """INSERT INTO bookings (user_id, name, phone, service_id, service_name,
                    hall_id, hall_name, master_id, master_name, date, time) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
@@ -328,28 +769,26 @@ class Database:
             return cursor.lastrowid
 
     async def cancel_booking(self, booking_id: int, user_id: int = None):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.write() as db:
             cursor = await db.execute(
-                "SELECT date, time, user_id, hall_id, master_id FROM bookings WHERE id = ?",
+                "SELECT date, time, user_id, hall_id, master_id, duration FROM bookings WHERE id = ?",
                 (booking_id,)
             )
             row = await cursor.fetchone()
             if not row:
                 return None
-            date, time, booked_uid, hall_id, master_id = row
+            date, time, booked_uid, hall_id, master_id, duration = row
             if user_id and booked_uid != user_id:
                 return None
             await db.execute("DELETE FROM bookings WHERE id = ?", (booking_id,))
-            await db.execute(
-                "UPDATE time_slots SET is_booked = 0, booked_by = NULL WHERE date = ? AND time = ? AND master_id = ?",
-                (date, time, master_id)
-            )
+            await self.slots.release(db, date, time, master_id, self.grid.span(duration))
             await db.execute("DELETE FROM reminder_tasks WHERE booking_id = ?", (booking_id,))
             await db.commit()
+            await self._refresh_dates(db, [date])
             return {"date": date, "time": time}
 
     async def get_user_active_booking(self, user_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.read() as db:
             cursor = await db.execute(
                 """SELECT id, date, time, service_name, hall_name, master_name FROM bookings
                    WHERE user_id = ? ORDER BY date DESC LIMIT 1""",
@@ -361,7 +800,7 @@ class Database:
             return None
 
     async def get_booking(self, booking_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.read() as db:
             cursor = await db.execute("""
                 SELECT id, user_id, name, phone, service_name, hall_id, master_id, date, time, reminder_sent
                 FROM bookings WHERE id = ?
@@ -376,7 +815,7 @@ class Database:
             return None
 
     async def get_bookings_for_date(self, date: str):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.read() as db:
             cursor = await db.execute(
                 """SELECT id, user_id, name, phone, service_name, hall_id, master_id, time
                    FROM bookings WHERE date = ? ORDER BY time""",
@@ -389,30 +828,146 @@ class Database:
             ]
 
     # ===== Reminders =====
-    async def add_reminder_task(self, booking_id: int, remind_at: str):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                "INSERT OR REPLACE INTO reminder_tasks (booking_id, remind_at) VALUES (?, ?)",
-                (booking_id, remind_at)
+    async def get_reminder_plans(self):
+        async with self.pool.read() as db:
+            cursor = await db.execute(
+                """SELECT id, hall_id, service_id, offset_minutes, kind, text, is_active
+                   FROM reminder_plans ORDER BY id"""
+            )
+            return await cursor.fetchall()
+
+    async def add_reminder_plan(self, offset_minutes: int, text: str, kind: str = "reminder",
+                                hall_id: int = None, service_id: int = None):
+        """Новый план; действует для записей, созданных после добавления"""
+        async with self.pool.write() as db:
+            cursor = await db.execute(
+                """INSERT INTO reminder_plans (hall_id, service_id, offset_minutes, kind, text)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (hall_id, service_id, offset_minutes, kind, text)
             )
             await db.commit()
+        self.invalidate_catalog()
+        return cursor.lastrowid
+
+    async def set_reminder_plan_active(self, plan_id: int, active: bool) -> bool:
+        """Включить/выключить план; False — плана с таким id нет"""
+        async with self.pool.write() as db:
+            cursor = await db.execute("UPDATE reminder_plans SET is_active = ? WHERE id = ?", (1 if active else 0, plan_id))
+            await db.commit()
+        self.invalidate_catalog()
+        return cursor.rowcount > 0
+
+    async def claim_due_reminders(self, limit: int = 100, lease: int = 300, max_attempts: int = 5):
+        """Взять в работу наступившие напоминания (включая просроченные)
 
-    async def get_pending_reminders(self):
-        async with aiosqlite.connect(self.db_path) as db:
-            now = datetime.now(tz).isoformat()
+        Строка арендуется на lease секунд: другой цикл её не возьмёт, а
+        после падения процесса она снова станет доступна.
+        """
+        now = datetime.now(tz)
+        async with self.pool.write() as db:
+            await db.execute("BEGIN IMMEDIATE")
             cursor = await db.execute("""
-                SELECT rt.booking_id, b.user_id, b.name, b.service_name, b.date, b.time, rt.remind_at
+                SELECT rt.id, rt.booking_id, rt.plan_id, b.user_id, b.service_name, b.date, b.time, rt.remind_at
                 FROM reminder_tasks rt
                 JOIN bookings b ON rt.booking_id = b.id
-                WHERE rt.remind_at > ? AND b.reminder_sent = 0
-            """, (now,))
+                WHERE rt.remind_at <= ? AND (rt.claimed_until IS NULL OR rt.claimed_until < ?)
+                  AND rt.attempts < ?
+                ORDER BY rt.remind_at LIMIT ?
+            """, (now.isoformat(), now.isoformat(), max_attempts, limit))
+            rows = await cursor.fetchall()
+            until = (now + timedelta(seconds=lease)).isoformat()
+            await db.executemany(
+                "UPDATE reminder_tasks SET attempts = attempts + 1, claimed_until = ? WHERE id = ?",
+                [(until, row[0]) for row in rows]
+            )
+            await db.commit()
+            return rows
+
+    async def get_reminders_between(self, start: str, end: str):
+        """[(task_id, booking_id, remind_at)] с start < remind_at <= end"""
+        async with self.pool.read() as db:
+            cursor = await db.execute(
+                "SELECT id, booking_id, remind_at FROM reminder_tasks WHERE remind_at > ? AND remind_at <= ?",
+                (start, end)
+            )
             return await cursor.fetchall()
 
-    async def mark_reminder_sent(self, booking_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
+    async def release_reminder(self, task_id: int):
+        """Вернуть напоминание в очередь после неудачной отправки"""
+        async with self.pool.write() as db:
+            await db.execute("UPDATE reminder_tasks SET claimed_until = NULL WHERE id = ?", (task_id,))
+            await db.commit()
+
+    async def drop_reminder(self, task_id: int):
+        """Снять напоминание без отправки (опоздали больше допустимого)"""
+        async with self.pool.write() as db:
+            await db.execute("DELETE FROM reminder_tasks WHERE id = ?", (task_id,))
+            await db.commit()
+
+    async def mark_reminder_sent(self, task_id: int, booking_id: int):
+        async with self.pool.write() as db:
             await db.execute("UPDATE bookings SET reminder_sent = 1 WHERE id = ?", (booking_id,))
-            await db.execute("DELETE FROM reminder_tasks WHERE booking_id = ?", (booking_id,))
+            await db.execute("DELETE FROM reminder_tasks WHERE id = ?", (task_id,))
+            await db.commit()
+
+    # ===== Outbox =====
+    async def claim_outbox(self, limit: int = 50, max_attempts: int = 10, lease: int = 300):
+        """Взять пачку неотправленных уведомлений в работу на lease секунд
+
+        Пока аренда не истекла, строку не возьмёт никто другой; если процесс
+        упал, не отметив отправку, строка вернётся в работу сама.
+        """
+        now = datetime.now(tz)
+        async with self.pool.write() as db:
+            await db.execute("BEGIN IMMEDIATE")
+            cursor = await db.execute(
+                """SELECT id, chat_id, text FROM outbox
+                   WHERE sent_at IS NULL AND attempts < ? AND (claimed_until IS NULL OR claimed_until < ?)
+                   ORDER BY id LIMIT ?""",
+                (max_attempts, now.isoformat(), limit)
+            )
+            rows = await cursor.fetchall()
+            until = (now + timedelta(seconds=lease)).isoformat()
+            await db.executemany(
+                "UPDATE outbox SET attempts = attempts + 1, claimed_until = ? WHERE id = ?",
+                [(until, row[0]) for row in rows]
+            )
             await db.commit()
+            return rows
+
+    async def mark_outbox_sent(self, outbox_id: int):
+        async with self.pool.write() as db:
+            await db.execute(
+                "UPDATE outbox SET sent_at = ?, claimed_until = NULL WHERE id = ?",
+                (datetime.now(tz).isoformat(), outbox_id)
+            )
+            await db.commit()
+
+    async def release_outbox(self, outbox_id: int):
+        """Вернуть уведомление в очередь после неудачной отправки"""
+        async with self.pool.write() as db:
+            await db.execute("UPDATE outbox SET claimed_until = NULL WHERE id = ?", (outbox_id,))
+            await db.commit()
+
+    async def purge_outbox(self, days: int = 7, max_attempts: int = 10):
+        """Удалить отправленные уведомления старше days дней и брошенные
+
+        Брошенные — исчерпали max_attempts и последняя попытка была
+        раньше days дней назад: иначе они навсегда остаются в выборке
+        claim_outbox по idx_outbox_pending. Возвращает (отправленных, брошенных).
+        """
+        before = (datetime.now(tz) - timedelta(days=days)).isoformat()
+        async with self.pool.write() as db:
+            cursor = await db.execute(
+                "DELETE FROM outbox WHERE sent_at IS NOT NULL AND sent_at < ?", (before,)
+            )
+            sent = cursor.rowcount
+            cursor = await db.execute(
+                "DELETE FROM outbox WHERE sent_at IS NULL AND attempts >= ? AND claimed_until < ?",
+                (max_attempts, before)
+            )
+            await db.commit()
+            return sent, cursor.rowcount
 
     # ===== Отчёты =====
     async def get_monthly_report(self, year: int, month: int, hall_id: int = None):
@@ -420,15 +975,12 @@ class Database:
         
         Если hall_id не указан — общий отчёт по всем залам
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            # Получаем все услуги с ценами
-            cursor = await db.execute("SELECT id, name, price FROM services")
-            services = {r[0]: {"name": r[1], "price": r[2]} for r in await cursor.fetchall()}
-            
-            # Получаем все залы
-            cursor = await db.execute("SELECT id, name FROM halls")
-            halls = {r[0]: r[1] for r in await cursor.fetchall()}
-            
+        catalog = await self.catalog.get()
+        # Услуги с ценами и залы — из кэша справочников
+        services = {sid: {"name": s[1], "price": s[2]} for sid, s in catalog.services.items()}
+        halls = catalog.hall_names
+
+        async with self.pool.read() as db:
             # Получаем записи за месяц
             start_date = f"{year}-{month:02d}-01"
             if month == 12:
@@ -477,92 +1029,157 @@ class Database:
             return report
 
     # ===== Чёрный список =====
+    async def _load_blacklist(self):
+        async with self.pool.read() as db:
+            cursor = await db.execute("SELECT user_id, reason FROM blacklist")
+            self._blacklist = {uid: reason or "" for uid, reason in await cursor.fetchall()}
+
     async def add_to_blacklist(self, user_id: int, reason: str = ""):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.write() as db:
             await db.execute(
                 "INSERT OR REPLACE INTO blacklist (user_id, reason, added_at) VALUES (?, ?, ?)",
                 (user_id, reason, datetime.now(tz).isoformat())
             )
             await db.commit()
+        self._blacklist[user_id] = reason or ""
+        self._changed("blacklist")
 
     async def remove_from_blacklist(self, user_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.write() as db:
             await db.execute("DELETE FROM blacklist WHERE user_id = ?", (user_id,))
             await db.commit()
+        self._blacklist.pop(user_id, None)
+        self._changed("blacklist")
 
     async def is_blacklisted(self, user_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("SELECT reason FROM blacklist WHERE user_id = ?", (user_id,))
-            row = await cursor.fetchone()
-            return row[0] if row else None
+        """Причина бана или None (из памяти, без запроса к БД)"""
+        return self._blacklist.get(user_id)
 
     async def get_blacklist(self):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.read() as db:
             cursor = await db.execute("SELECT user_id, reason, added_at FROM blacklist ORDER BY added_at DESC")
             return await cursor.fetchall()
 
     # ===== Отзывы =====
     async def add_review(self, user_id: int, name: str, rating: int, text: str = "", booking_id: int = None):
-        """Добавить отзыв"""
-        async with aiosqlite.connect(self.db_path) as db:
+        """Добавить отзыв и учесть его в сводке review_stats одной транзакцией"""
+        async with self.pool.write() as db:
+            await db.execute("BEGIN IMMEDIATE")
+            hall_id = None
+            if booking_id:
+                cursor = await db.execute("SELECT hall_id FROM bookings WHERE id = ?", (booking_id,))
+                row = await cursor.fetchone()
+                hall_id = row[0] if row else None
             cursor = await db.execute(
-                "INSERT INTO reviews (user_id, name, rating, text, booking_id) VALUES (?, ?, ?, ?, ?)",
-                (user_id, name, rating, text, booking_id)
+                "INSERT INTO reviews (user_id, name, rating, text, booking_id, hall_id) VALUES (?, ?, ?, ?, ?, ?)",
+                (user_id, name, rating, text, booking_id, hall_id)
+            )
+            await db.execute(
+                """INSERT INTO review_stats (hall_id, rating, count) VALUES (?, ?, 1)
+                   ON CONFLICT(hall_id, rating) DO UPDATE SET count = count + 1""",
+                (hall_id or 0, rating)
             )
             await db.commit()
             return cursor.lastrowid
 
-    async def get_reviews(self, limit: int = 20, rating_filter: int = None):
-        """Получить отзывы с фильтрацией"""
-        async with aiosqlite.connect(self.db_path) as db:
-            if rating_filter:
+    async def get_review_stats(self, hall_id: int = None):
+        """Средний рейтинг, число отзывов и распределение оценок по сводке
+
+        Читает не больше пяти строк на зал из review_stats вместо
+        агрегатов по всей таблице отзывов.
+        {"avg": 4.6, "count": 12, "ratings": {5: 9, 4: 2, 3: 1}}
+        """
+        async with self.pool.read() as db:
+            if hall_id:
                 cursor = await db.execute(
-                    "SELECT id, user_id, name, rating, text, booking_id, created_at FROM reviews WHERE rating = ? ORDER BY created_at DESC LIMIT ?",
-                    (rating_filter, limit)
+                    "SELECT rating, count FROM review_stats WHERE hall_id = ? AND count > 0",
+                    (hall_id,)
                 )
             else:
-                cursor = await db.execute(
-                    "SELECT id, user_id, name, rating, text, booking_id, created_at FROM reviews ORDER BY created_at DESC LIMIT ?",
-                    (limit,)
-                )
-            return await cursor.fetchall()
+                cursor = await db.execute("SELECT rating, count FROM review_stats WHERE count > 0")
+            rows = await cursor.fetchall()
+        ratings = {}
+        for rating, count in rows:
+            ratings[rating] = ratings.get(rating, 0) + count
+        total = sum(ratings.values())
+        avg = round(sum(r * c for r, c in ratings.items()) / total, 2) if total else 0
+        return {"avg": avg, "count": total, "ratings": dict(sorted(ratings.items(), reverse=True))}
+
+    async def get_reviews_page(self, limit: int = 10, rating: int = None, max_rating: int = 5,
+                               before: tuple = None, after: tuple = None) -> ReviewPage:
+        """Страница отзывов от новых к старым, keyset по (created_at, id)
+
+        before — курсор older прошлой страницы (листаем к старым),
+        after — курсор newer (к новым); без курсоров — первая страница.
+        Любая страница — поиск по индексу и limit + 1 строк, без OFFSET.
+        rating — только эта оценка, иначе все не выше max_rating.
+        """
+        if after:
+            sql = (
+                """SELECT id, user_id, name, rating, text, booking_id, created_at FROM reviews
+                   WHERE rating = ? AND (created_at, id) > (?, ?) ORDER BY created_at, id LIMIT ?"""
+                if rating else
+                """SELECT id, user_id, name, rating, text, booking_id, created_at FROM reviews
+                   WHERE (created_at, id) > (?, ?) AND rating <= ? ORDER BY created_at, id LIMIT ?"""
+            )
+            cursor_key = after
+        else:
+            sql = (
+                """SELECT id, user_id, name, rating, text, booking_id, created_at FROM reviews
+                   WHERE rating = ? AND (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT ?"""
+                if rating else
+                """SELECT id, user_id, name, rating, text, booking_id, created_at FROM reviews
+                   WHERE (created_at, id) < (?, ?) AND rating <= ? ORDER BY created_at DESC, id DESC LIMIT ?"""
+            )
+            cursor_key = before or REVIEWS_START
+        params = (rating, *cursor_key) if rating else (*cursor_key, max_rating)
+
+        async with self.pool.read() as db:
+            cursor = await db.execute(sql, (*params, limit + 1))
+            rows = await cursor.fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if after:
+            rows.reverse()
+        if not rows:
+            return ReviewPage(rows=[])
+
+        first, last = (rows[0][6], rows[0][0]), (rows[-1][6], rows[-1][0])
+        if after:
+            # Шли к новым: старее точно есть (мы оттуда), новее — если строк хватило
+            return ReviewPage(rows=rows, newer=first if more else None, older=last)
+        return ReviewPage(rows=rows, newer=first if before else None, older=last if more else None)
 
     async def get_average_rating(self, hall_id: int = None):
         """Получить средний рейтинг по залу или общий"""
-        async with aiosqlite.connect(self.db_path) as db:
-            if hall_id:
-                cursor = await db.execute("""
-                    SELECT AVG(r.rating) as avg_rating, COUNT(*) as count
-                    FROM reviews r
-                    JOIN bookings b ON r.booking_id = b.id
-                    WHERE b.hall_id = ?
-                """, (hall_id,))
-            else:
-                cursor = await db.execute("""
-                    SELECT AVG(rating) as avg_rating, COUNT(*) as count FROM reviews
-                """)
-            row = await cursor.fetchone()
-            if row and row[0]:
-                return {"avg": round(row[0], 2), "count": row[1]}
-            return {"avg": 0, "count": 0}
+        stats = await self.get_review_stats(hall_id)
+        return {"avg": stats["avg"], "count": stats["count"]}
 
     async def get_rating_stats(self):
         """Статистика по оценкам (сколько каждой)"""
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "SELECT rating, COUNT(*) as count FROM reviews GROUP BY rating ORDER BY rating DESC"
-            )
-            return {r[0]: r[1] for r in await cursor.fetchall()}
+        return (await self.get_review_stats())["ratings"]
 
     async def delete_review(self, review_id: int):
-        """Удалить отзыв"""
-        async with aiosqlite.connect(self.db_path) as db:
+        """Удалить отзыв и вычесть его из сводки; False — отзыва нет"""
+        async with self.pool.write() as db:
+            await db.execute("BEGIN IMMEDIATE")
+            cursor = await db.execute("SELECT rating, hall_id FROM reviews WHERE id = ?", (review_id,))
+            row = await cursor.fetchone()
+            if not row:
+                await db.rollback()
+                return False
+            rating, hall_id = row
             await db.execute("DELETE FROM reviews WHERE id = ?", (review_id,))
+            await db.execute(
+                "UPDATE review_stats SET count = count - 1 WHERE hall_id = ? AND rating = ?",
+                (hall_id or 0, rating)
+            )
             await db.commit()
+            return True
 
     async def has_user_reviewed(self, user_id: int, booking_id: int = None):
         """Проверил ли уже пользователь этот booking"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.read() as db:
             if booking_id:
                 cursor = await db.execute(
                     "SELECT id FROM reviews WHERE user_id = ? AND booking_id = ?",
@@ -0,0 +1,219 @@
+# database/fsm.py
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from copy import deepcopy
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+
+logger = logging.getLogger(__name__)
+
+
+def _key(key: StorageKey) -> str:
+    return ":".join(str(part) if part is not None else "" for part in (
+        key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny,
+    ))
+
+
+class _Record:
+    __slots__ = ("state", "data", "updated_at")
+
+    def __init__(self, state=None, data=None, updated_at=0.0):
+        self.state = state
+        self.data = data if data is not None else {}
+        self.updated_at = updated_at
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище в таблице fsm_states с write-back кэшем
+
+    Горячие состояния лежат в LRU на cache_size ключей, поэтому
+    get_state / get_data / update_data на пути записи не ходят в базу.
+    Изменённые ключи раз в flush_interval пишутся одной транзакцией;
+    пустые (state=None и data={}) удаляются. Промах кэша читает строку
+    из базы. Сессии без изменений дольше ttl секунд считаются пустыми
+    и раз в PURGE_EVERY вычищаются из базы и кэша.
+
+    При аварийном падении теряется не больше flush_interval последних
+    изменений; close() сбрасывает всё. Кэш у каждого процесса свой,
+    поэтому апдейты одного пользователя должны попадать в один процесс.
+    """
+
+    PURGE_EVERY = 300  # секунд между чистками просроченных сессий
+
+    def __init__(self, db, cache_size: int = 10000, flush_interval: float = 1.0, ttl: float = 24 * 3600):
+        self.pool = db.pool
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+
+        self._cache = OrderedDict()  # key -> _Record
+        self._dirty = set()
+        self._flushing = set()  # ключи сброса, который ещё не закоммичен
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+        self.written = 0
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    # ===== BaseStorage =====
+
+    async def set_state(self, key: StorageKey, state=None):
+        record = await self._record(_key(key))
+        record.state = state.state if isinstance(state, State) else state
+        self._touch(_key(key), record)
+
+    async def get_state(self, key: StorageKey):
+        return (await self._record(_key(key))).state
+
+    async def set_data(self, key: StorageKey, data):
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(f"Data must be a dict or dict-like object, got {type(data).__name__}")
+        record = await self._record(_key(key))
+        record.data = deepcopy(data)
+        self._touch(_key(key), record)
+
+    async def get_data(self, key: StorageKey):
+        return deepcopy((await self._record(_key(key))).data)
+
+    # ===== Кэш =====
+
+    async def _record(self, k: str) -> _Record:
+        record = self._cache.get(k)
+        if record is None:
+            self.misses += 1
+            loaded = await self._load(k)
+            # Пока читали базу, тот же ключ мог загрузить и изменить
+            # параллельный апдейт — берём его запись, иначе правки потеряются
+            record = self._cache.get(k)
+            if record is None:
+                record = loaded
+                self._evict(reserve=1)
+                self._cache[k] = record
+            else:
+                self._cache.move_to_end(k)
+        else:
+            self.hits += 1
+            self._cache.move_to_end(k)
+        if record.updated_at and record.updated_at < time.time() - self.ttl:
+            # Сессия простояла дольше ttl — начинаем с чистого листа
+            record.state, record.data = None, {}
+            self._dirty.add(k)
+        return record
+
+    def _touch(self, k: str, record: _Record):
+        record.updated_at = time.time()
+        self._dirty.add(k)
+
+    def _evict(self, reserve: int = 0):
+        """Выбросить самые старые чистые записи; грязные дождутся сброса"""
+        excess = len(self._cache) + reserve - self.cache_size
+        if excess <= 0:
+            return
+        for k in list(self._cache):
+            if k not in self._dirty and k not in self._flushing:
+                del self._cache[k]
+                excess -= 1
+                if not excess:
+                    return
+
+    async def _load(self, k: str) -> _Record:
+        async with self.pool.read() as db:
+            cursor = await db.execute("SELECT state, data, updated_at FROM fsm_states WHERE key = ?", (k,))
+            row = await cursor.fetchone()
+        if not row:
+            return _Record()
+        return _Record(row[0], json.loads(row[1]) if row[1] else {}, row[2])
+
+    # ===== Сброс в базу =====
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_purge = loop.time() + self.PURGE_EVERY
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if loop.time() >= next_purge:
+                    await self.purge()
+                    next_purge = loop.time() + self.PURGE_EVERY
+            except Exception:
+                logger.exception("FSM: ошибка сброса состояний")
+
+    async def flush(self):
+        """Записать все изменённые ключи одной транзакцией"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, set()
+            # Пока ждём соединение записи, эти ключи нельзя вытеснять:
+            # промах прочитал бы из базы ещё старую строку
+            self._flushing = dirty
+            upserts, deletes = [], []
+            for k in dirty:
+                record = self._cache.get(k)
+                if record is None:
+                    continue
+                if record.state is None and not record.data:
+                    deletes.append((k,))
+                else:
+                    upserts.append((k, record.state, json.dumps(record.data, ensure_ascii=False),
+                                    record.updated_at))
+            try:
+                async with self.pool.write() as db:
+                    await db.execute("BEGIN IMMEDIATE")
+                    if upserts:
+                        await db.executemany(
+                            """INSERT INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+                               ON CONFLICT(key) DO UPDATE SET
+                                   state = excluded.state, data = excluded.data, updated_at = excluded.updated_at""",
+                            upserts
+                        )
+                    if deletes:
+                        await db.executemany("DELETE FROM fsm_states WHERE key = ?", deletes)
+                    await db.commit()
+            except BaseException:
+                # Не записали — вернём ключи, попробуем в следующий раз
+                self._dirty |= dirty
+                raise
+            finally:
+                self._flushing = set()
+            self.flushes += 1
+            self.written += len(upserts) + len(deletes)
+            self._evict()
+
+    async def purge(self):
+        """Удалить сессии, не менявшиеся дольше ttl"""
+        cutoff = time.time() - self.ttl
+        for k in [k for k, r in self._cache.items() if r.updated_at and r.updated_at < cutoff]:
+            if k not in self._dirty and k not in self._flushing:
+                del self._cache[k]
+        async with self.pool.write() as db:
+            await db.execute("DELETE FROM fsm_states WHERE updated_at < ?", (cutoff,))
+            await db.commit()
+
+    def stats(self):
+        return {
+            "cached": len(self._cache),
+            "dirty": len(self._dirty),
+            "hits": self.hits,
+            "misses": self.misses,
+            "flushes": self.flushes,
+            "written": self.written,
+        }
@@ -0,0 +1,114 @@
+# database/pool.py
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import aiosqlite
+
+
+class ConnectionPool:
+    """Пул соединений SQLite: один писатель + N читателей
+
+    Соединения открываются один раз в open() и живут до close().
+    Писатель сериализован через asyncio.Lock, читатели выдаются из очереди.
+    """
+
+    def __init__(self, db_path: str, readers: int = 4, busy_timeout: int = 5000, cache_size: int = -8000):
+        self.db_path = db_path
+        self.size = max(1, readers)
+        self.busy_timeout = busy_timeout
+        self.cache_size = cache_size
+
+        self._writer = None
+        self._write_lock = asyncio.Lock()
+        self._readers = asyncio.Queue()
+        self._all_readers = []
+
+        # Статистика
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.in_use = 0
+
+    @staticmethod
+    async def _pragma(conn, sql: str):
+        # Курсор PRAGMA закрываем сразу, иначе он держит блокировку
+        cursor = await conn.execute(sql)
+        await cursor.fetchall()
+        await cursor.close()
+
+    async def _connect(self):
+        conn = await aiosqlite.connect(self.db_path)
+        await self._pragma(conn, f"PRAGMA busy_timeout = {int(self.busy_timeout)}")
+        await self._pragma(conn, "PRAGMA synchronous = NORMAL")
+        await self._pragma(conn, f"PRAGMA cache_size = {int(self.cache_size)}")
+        await self._pragma(conn, "PRAGMA temp_store = MEMORY")
+        return conn
+
+    async def open(self):
+        if self._writer is not None:
+            return
+        self._writer = await self._connect()
+        # WAL — читатели не блокируют писателя и наоборот
+        await self._pragma(self._writer, "PRAGMA journal_mode = WAL")
+        for _ in range(self.size):
+            conn = await self._connect()
+            self._all_readers.append(conn)
+            self._readers.put_nowait(conn)
+
+    async def close(self):
+        for conn in self._all_readers:
+            await conn.close()
+        self._all_readers = []
+        self._readers = asyncio.Queue()
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
+
+    def _checkout(self, started: float):
+        waited = time.perf_counter() - started
+        self.checkouts += 1
+        self.wait_time += waited
+        if waited > 0.001:
+            self.waits += 1
+        self.in_use += 1
+
+    @asynccontextmanager
+    async def read(self):
+        """Соединение для чтения"""
+        started = time.perf_counter()
+        conn = await self._readers.get()
+        self._checkout(started)
+        try:
+            yield conn
+        finally:
+            self.in_use -= 1
+            self._readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def write(self):
+        """Единственное соединение для записи (сериализовано)
+
+        При исключении незакоммиченная транзакция откатывается.
+        """
+        started = time.perf_counter()
+        async with self._write_lock:
+            self._checkout(started)
+            try:
+                yield self._writer
+            except BaseException:
+                if self._writer.in_transaction:
+                    await self._writer.rollback()
+                raise
+            finally:
+                self.in_use -= 1
+
+    def stats(self):
+        return {
+            "readers": self.size,
+            "checkouts": self.checkouts,
+            "waits": self.waits,
+            "wait_time_ms": round(self.wait_time * 1000, 3),
+            "avg_wait_us": round(self.wait_time / self.checkouts * 1_000_000, 1) if self.checkouts else 0,
+            "in_use": self.in_use,
+        }
@@ -0,0 +1,325 @@
+# database/slots.py
+import bisect
+from functools import lru_cache
+from config.settings import get_settings
+
+# Маска хранится в INTEGER SQLite (знаковое 64 бит) — старший бит не трогаем
+MAX_SLOTS_PER_DAY = 62
+
+
+class SlotGrid:
+    """Сетка слотов рабочего дня
+
+    Слот i начинается в start + i * step минут. Номер слота — номер бита
+    в маске: маска 0b101 — слоты 0 и 2.
+    """
+
+    def __init__(self, start: str = "10:00", end: str = "20:00", step: int = 60):
+        start_min = _to_minutes(start)
+        end_min = _to_minutes(end)
+        if step <= 0 or end_min <= start_min:
+            raise ValueError(f"Неверная сетка слотов: {start}-{end}, шаг {step}")
+
+        self.step = step
+        self.start_minutes = start_min
+        self.times = [_to_time(m) for m in range(start_min, end_min, step)]
+        if len(self.times) > MAX_SLOTS_PER_DAY:
+            raise ValueError(f"Слишком мелкая сетка: {len(self.times)} слотов (максимум {MAX_SLOTS_PER_DAY})")
+        self.index = {t: i for i, t in enumerate(self.times)}
+        self.full_mask = (1 << len(self.times)) - 1
+
+    def __len__(self):
+        return len(self.times)
+
+    def bit(self, time: str) -> int:
+        return 1 << self.index[time]
+
+    def mask(self, times) -> int:
+        """Маска из списка времён; времена вне сетки игнорируются"""
+        mask = 0
+        for t in times:
+            i = self.index.get(t)
+            if i is not None:
+                mask |= 1 << i
+        return mask
+
+    def times_of(self, mask: int) -> list:
+        """Времена установленных битов, по возрастанию"""
+        result = []
+        while mask:
+            low = mask & -mask
+            result.append(self.times[low.bit_length() - 1])
+            mask ^= low
+        return result
+
+    def span(self, duration: int = None) -> int:
+        """Сколько слотов сетки занимает услуга длительностью duration минут"""
+        if not duration:
+            return 1
+        return max(1, -(-duration // self.step))
+
+    def run(self, time: str, span: int = 1) -> int:
+        """Маска span слотов подряд, начиная с time; 0 — не влезает в день"""
+        i = self.index.get(time)
+        if i is None or i + span > len(self.times):
+            return 0
+        return ((1 << span) - 1) << i
+
+    def after(self, time: str) -> int:
+        """Маска слотов, начинающихся строго позже time"""
+        first = bisect.bisect_right(self.times, time)
+        return self.full_mask & ~((1 << first) - 1)
+
+    def starts(self, free: int, span: int = 1) -> int:
+        """Маска допустимых начал: все span слотов от начала свободны
+
+        Бит s остаётся, если свободны биты s..s+span-1. Считаем удвоением
+        сдвига: после шага с покрытием c маска хранит отрезки длины c,
+        поэтому хватает O(log span) операций AND/SHIFT на весь день.
+        """
+        covered = 1
+        while covered < span:
+            shift = min(covered, span - covered)
+            free &= free >> shift
+            covered += shift
+        return free
+
+
+def _to_minutes(hhmm: str) -> int:
+    h, m = hhmm.split(":")
+    return int(h) * 60 + int(m)
+
+
+def _to_time(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+@lru_cache()
+def get_slot_grid() -> SlotGrid:
+    settings = get_settings()
+    return SlotGrid(settings["SLOT_DAY_START"], settings["SLOT_DAY_END"], settings["SLOT_GRANULARITY"])
+
+
+class RowSlotStore:
+    """Слоты строками time_slots — одна строка на (дата, время, мастер)"""
+
+    mode = "rows"
+
+    def __init__(self, grid: SlotGrid):
+        self.grid = grid
+
+    async def generate(self, db, dates: list, master_ids: list, template_mask: int):
+        """Создать слоты по шаблону; {дата: сколько добавлено}"""
+        template = self.grid.times_of(template_mask)
+        # Уже существующие слоты в диапазоне — чтобы посчитать добавленные
+        cursor = await db.execute(
+            "SELECT date, time, master_id FROM time_slots WHERE date >= ? AND date <= ?",
+            (dates[0], dates[-1])
+        )
+        existing = set(await cursor.fetchall())
+        rows = [
+            (date, time, master_id)
+            for date in dates
+            for master_id in master_ids
+            for time in template
+            if (date, time, master_id) not in existing
+        ]
+        await db.executemany(
+            "INSERT OR IGNORE INTO time_slots (date, time, master_id) VALUES (?, ?, ?)",
+            rows
+        )
+        counts = {date: 0 for date in dates}
+        for date, _, _ in rows:
+            counts[date] += 1
+        return counts
+
+    async def open(self, db, date: str, time: str, master_id: int):
+        await db.execute(
+            "INSERT OR IGNORE INTO time_slots (date, time, master_id) VALUES (?, ?, ?)",
+            (date, time, master_id)
+        )
+
+    async def close(self, db, date: str, time: str, master_id: int):
+        await db.execute(
+            "DELETE FROM time_slots WHERE date = ? AND time = ? AND master_id = ?",
+            (date, time, master_id)
+        )
+
+    async def claim(self, db, date: str, time: str, master_id: int, user_id: int, span: int = 1) -> bool:
+        """Занять span слотов подряд
+
+        При span > 1 вызывать внутри транзакции: если занялась только
+        часть слотов, вернётся False и транзакцию нужно откатить.
+        """
+        run = self.grid.times_of(self.grid.run(time, span))
+        if not run:
+            return False
+        cursor = await db.execute(
+            """UPDATE time_slots SET is_booked = 1, booked_by = ?
+               WHERE date = ? AND master_id = ? AND time >= ? AND time <= ? AND is_booked = 0""",
+            (user_id, date, master_id, run[0], run[-1])
+        )
+        return cursor.rowcount == span
+
+    async def release(self, db, date: str, time: str, master_id: int, span: int = 1):
+        run = self.grid.times_of(self.grid.run(time, span)) or [time]
+        await db.execute(
+            """UPDATE time_slots SET is_booked = 0, booked_by = NULL
+               WHERE date = ? AND master_id = ? AND time >= ? AND time <= ?""",
+            (date, master_id, run[0], run[-1])
+        )
+
+    async def free_mask(self, db, date: str, master_id: int) -> int:
+        cursor = await db.execute(
+            "SELECT time FROM time_slots WHERE date = ? AND master_id = ? AND is_booked = 0",
+            (date, master_id)
+        )
+        return self.grid.mask(r[0] for r in await cursor.fetchall())
+
+    async def free_times(self, db, date: str, master_id: int, span: int = 1) -> list:
+        return self.grid.times_of(self.grid.starts(await self.free_mask(db, date, master_id), span))
+
+    async def free_masks(self, db, date_from: str, date_to: str) -> dict:
+        """Свободные маски открытых рабочих дней диапазона: {(дата, мастер): маска}"""
+        cursor = await db.execute(
+            """SELECT s.date, s.master_id, s.time FROM time_slots s
+               JOIN working_days w ON w.date = s.date
+               WHERE s.date >= ? AND s.date <= ? AND s.is_booked = 0 AND w.is_closed = 0""",
+            (date_from, date_to)
+        )
+        masks = {}
+        index = self.grid.index
+        for date, master_id, time in await cursor.fetchall():
+            i = index.get(time)
+            if i is not None:
+                masks[(date, master_id)] = masks.get((date, master_id), 0) | (1 << i)
+        return masks
+
+    async def drop_date(self, db, date: str):
+        await db.execute("DELETE FROM time_slots WHERE date = ?", (date,))
+
+    async def drop_all(self, db):
+        await db.execute("DELETE FROM time_slots")
+
+
+class BitmapSlotStore:
+    """Компактное хранение: одна строка slot_masks на (дата, мастер)
+
+    open_mask — открытые слоты, booked_mask — занятые.
+    Занять слот — compare-and-swap UPDATE по маскам.
+    """
+
+    mode = "bitmap"
+
+    def __init__(self, grid: SlotGrid):
+        self.grid = grid
+
+    async def generate(self, db, dates: list, master_ids: list, template_mask: int):
+        cursor = await db.execute(
+            "SELECT date, master_id, open_mask FROM slot_masks WHERE date >= ? AND date <= ?",
+            (dates[0], dates[-1])
+        )
+        existing = {(date, mid): mask for date, mid, mask in await cursor.fetchall()}
+        counts = {date: 0 for date in dates}
+        rows = []
+        for date in dates:
+            for master_id in master_ids:
+                old = existing.get((date, master_id), 0)
+                added = template_mask & ~old
+                if added:
+                    counts[date] += bin(added).count("1")
+                    rows.append((date, master_id, template_mask, template_mask))
+        await db.executemany(
+            """INSERT INTO slot_masks (date, master_id, open_mask, booked_mask) VALUES (?, ?, ?, 0)
+               ON CONFLICT (date, master_id) DO UPDATE SET open_mask = open_mask | ?""",
+            rows
+        )
+        return counts
+
+    async def open(self, db, date: str, time: str, master_id: int):
+        bit = self.grid.bit(time)
+        await db.execute(
+            """INSERT INTO slot_masks (date, master_id, open_mask, booked_mask) VALUES (?, ?, ?, 0)
+               ON CONFLICT (date, master_id) DO UPDATE SET open_mask = open_mask | ?""",
+            (date, master_id, bit, bit)
+        )
+
+    async def close(self, db, date: str, time: str, master_id: int):
+        keep = ~self.grid.bit(time)
+        await db.execute(
+            "UPDATE slot_masks SET open_mask = open_mask & ?, booked_mask = booked_mask & ? WHERE date = ? AND master_id = ?",
+            (keep, keep, date, master_id)
+        )
+
+    async def claim(self, db, date: str, time: str, master_id: int, user_id: int, span: int = 1) -> bool:
+        """Занять span слотов подряд одним compare-and-swap UPDATE"""
+        run = self.grid.run(time, span)
+        if not run:
+            return False
+        cursor = await db.execute(
+            """UPDATE slot_masks SET booked_mask = booked_mask | ?
+               WHERE date = ? AND master_id = ? AND (open_mask & ?) = ? AND (booked_mask & ?) = 0""",
+            (run, date, master_id, run, run, run)
+        )
+        return cursor.rowcount > 0
+
+    async def release(self, db, date: str, time: str, master_id: int, span: int = 1):
+        run = self.grid.run(time, span)
+        if not run:
+            return
+        await db.execute(
+            "UPDATE slot_masks SET booked_mask = booked_mask & ? WHERE date = ? AND master_id = ?",
+            (~run, date, master_id)
+        )
+
+    async def free_mask(self, db, date: str, master_id: int) -> int:
+        cursor = await db.execute(
+            "SELECT open_mask & ~booked_mask FROM slot_masks WHERE date = ? AND master_id = ?",
+            (date, master_id)
+        )
+        row = await cursor.fetchone()
+        return row[0] if row else 0
+
+    async def free_times(self, db, date: str, master_id: int, span: int = 1) -> list:
+        return self.grid.times_of(self.grid.starts(await self.free_mask(db, date, master_id), span))
+
+    async def free_masks(self, db, date_from: str, date_to: str) -> dict:
+        cursor = await db.execute(
+            """SELECT s.date, s.master_id, s.open_mask & ~s.booked_mask FROM slot_masks s
+               JOIN working_days w ON w.date = s.date
+               WHERE s.date >= ? AND s.date <= ? AND w.is_closed = 0 AND (s.open_mask & ~s.booked_mask) != 0""",
+            (date_from, date_to)
+        )
+        return {(date, master_id): mask for date, master_id, mask in await cursor.fetchall()}
+
+    async def drop_date(self, db, date: str):
+        await db.execute("DELETE FROM slot_masks WHERE date = ?", (date,))
+
+    async def drop_all(self, db):
+        await db.execute("DELETE FROM slot_masks")
+
+    async def import_rows(self, db):
+        """Перенести слоты из time_slots (при переключении на bitmap)"""
+        cursor = await db.execute(
+            "SELECT date, master_id, time, is_booked FROM time_slots  -- plan: full scan (разовая миграция)"
+        )
+        masks = {}
+        for date, master_id, time, is_booked in await cursor.fetchall():
+            if time not in self.grid.index:
+                continue
+            bit = self.grid.bit(time)
+            open_mask, booked_mask = masks.get((date, master_id), (0, 0))
+            masks[(date, master_id)] = (open_mask | bit, booked_mask | (bit if is_booked else 0))
+        await db.executemany(
+            "INSERT OR IGNORE INTO slot_masks (date, master_id, open_mask, booked_mask) VALUES (?, ?, ?, ?)",
+            [(date, mid, o, b) for (date, mid), (o, b) in masks.items()]
+        )
+        return len(masks)
+
+
+def make_slot_store(mode: str, grid: SlotGrid):
+    if mode == "bitmap":
+        return BitmapSlotStore(grid)
+    if mode == "rows":
+        return RowSlotStore(grid)
+    raise ValueError(f"Неизвестный SLOT_STORAGE: {mode}")
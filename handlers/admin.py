@@ -7,11 +7,12 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from config.settings import get_settings
 from database.db import Database
-from keyboards.main import admin_menu_kb, main_menu_kb
+from database.slots import get_slot_grid
+from keyboards.main import admin_menu_kb, main_menu_kb, parse_review_cursor, reviews_nav_row
 from keyboards.booking import calendar_kb, slots_kb, add_day_calendar_kb
 from datetime import datetime
+import html
 import logging
-import aiosqlite
 
 logger = logging.getLogger(__name__)
 
@@ -176,14 +177,12 @@ async def admin_add_all_days(cb: types.CallbackQuery, state: FSMContext, db: Dat
     # Добавляем 30 дней начиная с сегодня
     from datetime import timedelta
     today = datetime.now().date()
-    added = []
-    
-    for i in range(30):
-        date = (today + timedelta(days=i)).isoformat()
-        working_days = await db.get_working_days(days_ahead=60)
-        if date not in working_days:
-            await db.add_working_day(date)
-            added.append(date)
+    working_days = set(await db.get_working_days(days_ahead=60))
+    dates = [(today + timedelta(days=i)).isoformat() for i in range(30)]
+    added = [d for d in dates if d not in working_days]
+
+    # Все дни и слоты — одной транзакцией
+    await db.add_working_days(added)
     
     working_days = await db.get_working_days(days_ahead=60)
     await state.update_data(selected_dates=working_days)
@@ -224,12 +223,7 @@ async def admin_confirm_clear_all(cb: types.CallbackQuery, db: Database):
     working_days = await db.get_working_days(days_ahead=365)
     
     # Удаляем все записи и слоты
-    import aiosqlite
-    async with aiosqlite.connect(db.db_path) as conn:
-        await conn.execute("DELETE FROM bookings")
-        await conn.execute("DELETE FROM time_slots")
-        await conn.execute("DELETE FROM working_days")
-        await conn.commit()
+    await db.clear_schedule()
     
     await cb.message.edit_text(
         "🗑 <b>Все данные очищены</b>",
@@ -342,6 +336,30 @@ async def admin_select_master_for_slots(cb: types.CallbackQuery, db: Database):
     )
 
 
+async def slot_bookings(db: Database, date: str, master_id: int) -> dict:
+    """Записи мастера на дату по каждому занятому слоту сетки
+
+    Услуга длиннее шага занимает несколько слотов — все они ведут
+    на одну запись ("start" — время её начала).
+    """
+    grid = get_slot_grid()
+    async with db.pool.read() as db_conn:
+        cursor = await db_conn.execute("""
+            SELECT time, id, user_id, name, service_name, duration
+            FROM bookings
+            WHERE date = ? AND master_id = ?
+        """, (date, master_id))
+        rows = await cursor.fetchall()
+
+    bookings = {}
+    for time, bid, user_id, name, service, duration in rows:
+        booking = {"id": bid, "user_id": user_id, "name": name, "service": service, "start": time}
+        covered = grid.times_of(grid.run(time, grid.span(duration))) or [time]
+        for t in covered:
+            bookings[t] = booking
+    return bookings
+
+
 @router.callback_query(F.data.startswith("slots:"))
 async def admin_view_slots(cb: types.CallbackQuery, db: Database):
     """Просмотр слотов для мастера"""
@@ -354,23 +372,18 @@ async def admin_view_slots(cb: types.CallbackQuery, db: Database):
     master_id = int(parts[2])
     master_name = await db.get_master_name(master_id)
 
-    slots = await db.get_available_slots(date, master_id)
-    all_slots = [f"{h:02d}:00" for h in range(10, 20)]
+    slots = set(await db.get_available_slots(date, master_id))
+    all_slots = get_slot_grid().times
 
     # Получаем все записи на эту дату и мастера
-    async with aiosqlite.connect(db.db_path) as db_conn:
-        cursor = await db_conn.execute("""
-            SELECT time, id, user_id, name, service_name
-            FROM bookings
-            WHERE date = ? AND master_id = ?
-        """, (date, master_id))
-        bookings = {r[0]: {"id": r[1], "user_id": r[2], "name": r[3], "service": r[4]} for r in await cursor.fetchall()}
+    bookings = await slot_bookings(db, date, master_id)
 
     kb = []
     for t in all_slots:
         if t in bookings:
             # Есть запись — показываем кликабельным
-            time_idx = all_slots.index(t)
+            # Слот под записью (в т.ч. продолжение длинной услуги) — отчёт по её началу
+            time_idx = all_slots.index(bookings[t]['start'])
             kb.append([InlineKeyboardButton(
                 text=f"❌ {t} ({bookings[t]['name']})",
                 callback_data=f"aslot_report:{date}:{time_idx}:{master_id}"
@@ -419,7 +432,7 @@ async def admin_toggle_slot(cb: types.CallbackQuery, db: Database):
     
     # Разбираем time_idx и master_id
     time_idx = int(time_idx_master)
-    all_slots = [f"{h:02d}:00" for h in range(10, 20)]
+    all_slots = get_slot_grid().times
     time = all_slots[time_idx]
     
     # Получаем master_id из состояния или из callback
@@ -436,6 +449,10 @@ async def admin_toggle_slot(cb: types.CallbackQuery, db: Database):
     time = all_slots[time_idx]
     master_name = await db.get_master_name(master_id)
 
+    if time in await slot_bookings(db, date, master_id):
+        await cb.answer(f"❌ {time} занят записью", show_alert=True)
+        return
+
     available = await db.get_available_slots(date, master_id)
     if time in available:
         await db.remove_time_slot(date, time, master_id)
@@ -445,20 +462,15 @@ async def admin_toggle_slot(cb: types.CallbackQuery, db: Database):
         await cb.answer(f"✅ {time} добавлен", show_alert=True)
 
     # Обновляем клавиатуру
-    slots = await db.get_available_slots(date, master_id)
+    slots = set(await db.get_available_slots(date, master_id))
 
-    async with aiosqlite.connect(db.db_path) as db_conn:
-        cursor = await db_conn.execute("""
-            SELECT time, id, user_id, name, service_name
-            FROM bookings
-            WHERE date = ? AND master_id = ?
-        """, (date, master_id))
-        bookings = {r[0]: {"id": r[1], "user_id": r[2], "name": r[3], "service": r[4]} for r in await cursor.fetchall()}
+    bookings = await slot_bookings(db, date, master_id)
 
     kb = []
     for t in all_slots:
         if t in bookings:
-            time_idx = all_slots.index(t)
+            # Слот под записью (в т.ч. продолжение длинной услуги) — отчёт по её началу
+            time_idx = all_slots.index(bookings[t]['start'])
             kb.append([InlineKeyboardButton(
                 text=f"❌ {t} ({bookings[t]['name']})",
                 callback_data=f"aslot_report:{date}:{time_idx}:{master_id}"
@@ -494,8 +506,7 @@ async def admin_toggle_slot(cb: types.CallbackQuery, db: Database):
 @router.callback_query(F.data.startswith("aslot_report:"))
 async def admin_slot_report(cb: types.CallbackQuery, db: Database):
     """Показать информацию о записи в слоте"""
-    import logging
-    logging.info(f"aslot_report callback: {cb.data}")
+    logger.debug("aslot_report callback: %s", cb.data)
 
     if not is_admin(cb.from_user.id):
         await cb.answer("🔐 Доступ запрещён", show_alert=True)
@@ -504,7 +515,7 @@ async def admin_slot_report(cb: types.CallbackQuery, db: Database):
     # Формат: aslot_report:DATE:TIME_IDX:MASTER_ID
     parts = cb.data.split(":")
     if len(parts) < 4:
-        logging.error(f"Неверный формат callback: {cb.data}")
+        logger.error(f"Неверный формат callback: {cb.data}")
         await cb.answer("❌ Ошибка формата", show_alert=True)
         return
 
@@ -512,15 +523,15 @@ async def admin_slot_report(cb: types.CallbackQuery, db: Database):
     time_idx = int(parts[2])
     master_id = int(parts[3])
     
-    all_slots = [f"{h:02d}:00" for h in range(10, 20)]
+    all_slots = get_slot_grid().times
     time = all_slots[time_idx]
 
-    logging.info(f"Date: {date}, Time: {time}, Master: {master_id}")
+    logger.debug("Date: %s, Time: %s, Master: %s", date, time, master_id)
 
     master_name = await db.get_master_name(master_id)
 
     # Ищем запись в этом слоте
-    async with aiosqlite.connect(db.db_path) as db_conn:
+    async with db.pool.read() as db_conn:
         cursor = await db_conn.execute("""
             SELECT id, user_id, name, phone, service_name, hall_id
             FROM bookings
@@ -528,7 +539,7 @@ async def admin_slot_report(cb: types.CallbackQuery, db: Database):
         """, (date, time, master_id))
         booking = await cursor.fetchone()
 
-    logging.info(f"Booking: {booking}")
+    logger.debug("Booking: %s", booking)
 
     if not booking:
         await cb.answer("ℹ️ Нет записи на это время", show_alert=True)
@@ -556,7 +567,7 @@ async def admin_slot_report(cb: types.CallbackQuery, db: Database):
 
 
 @router.callback_query(F.data.startswith("aban:"))
-async def admin_ban_from_slot(cb: types.CallbackQuery, db: Database):
+async def admin_ban_from_slot(cb: types.CallbackQuery, db: Database, scheduler):
     """Забанить клиента из записи"""
     if not is_admin(cb.from_user.id):
         await cb.answer("🔐 Доступ запрещён", show_alert=True)
@@ -567,8 +578,9 @@ async def admin_ban_from_slot(cb: types.CallbackQuery, db: Database):
     
     await db.add_to_blacklist(user_id, "Проблемный клиент (отмечен админом)")
     
-    # Отменяем запись
-    await db.cancel_booking(int(bid))
+    # Отменяем запись и её напоминания в колесе
+    if await db.cancel_booking(int(bid)):
+        scheduler.cancel(int(bid))
     
     await cb.answer(f"✅ Пользователь {user_id} добавлен в ЧС", show_alert=True)
     
@@ -886,6 +898,174 @@ async def cmd_unban(msg: types.Message, db: Database):
     await msg.answer(f"✅ Пользователь <code>{user_id}</code> разблокирован", parse_mode="HTML")
 
 
+@router.message(Command("mprice"))
+async def cmd_master_price(msg: types.Message, db: Database):
+    """Своя цена мастера на услугу: /mprice master_id service_id цена|-"""
+    if not is_admin(msg.from_user.id):
+        await msg.answer("🔐 Доступ запрещён.")
+        return
+
+    parts = msg.text.split()
+    if len(parts) < 4:
+        await msg.answer(
+            "Использование:\n"
+            "<code>/mprice master_id service_id цена</code>\n"
+            "<code>/mprice master_id service_id -</code> — вернуть общую цену",
+            parse_mode="HTML"
+        )
+        return
+
+    try:
+        master_id = int(parts[1])
+        service_id = int(parts[2])
+        price = None if parts[3] == "-" else int(parts[3])
+    except ValueError:
+        await msg.answer("❌ Неверные параметры (должны быть числа)")
+        return
+
+    catalog = await db.get_catalog()
+    service = catalog.services.get(service_id)
+    if master_id not in catalog.master_names or not service:
+        await msg.answer("❌ Мастер или услуга не найдены")
+        return
+    if catalog.master_halls[master_id] != service[4]:
+        await msg.answer("❌ Услуга из другого зала")
+        return
+
+    await db.set_master_price(master_id, service_id, price)
+
+    shown = f"{price}₽" if price is not None else f"общая ({service[2]}₽)"
+    await msg.answer(
+        f"✅ {catalog.master_names[master_id]}: {service[1]} — {shown}",
+        parse_mode="HTML"
+    )
+
+
+# ===== ПЛАНЫ НАПОМИНАНИЙ =====
+PLAN_KINDS = ("reminder", "review")
+
+
+def _plan_offset(minutes: int) -> str:
+    """-1440 → «за 24 ч», 180 → «через 3 ч»"""
+    value = abs(minutes)
+    amount = f"{value // 60} ч" if value % 60 == 0 else f"{value} мин"
+    return f"за {amount}" if minutes < 0 else f"через {amount}"
+
+
+@router.message(Command("plans"))
+async def cmd_plans(msg: types.Message, db: Database):
+    """Список планов напоминаний"""
+    if not is_admin(msg.from_user.id):
+        await msg.answer("🔐 Доступ запрещён.")
+        return
+
+    plans = await db.get_reminder_plans()
+    if not plans:
+        await msg.answer("🔔 Планов напоминаний нет")
+        return
+
+    catalog = await db.get_catalog()
+    text = "🔔 <b>Планы напоминаний:</b>\n\n"
+    for plan_id, hall_id, service_id, offset, kind, plan_text, is_active in plans:
+        scope = []
+        if hall_id is not None:
+            scope.append(catalog.hall_names.get(hall_id, f"зал {hall_id}"))
+        if service_id is not None:
+            service = catalog.services.get(service_id)
+            scope.append(service[1] if service else f"услуга {service_id}")
+        text += (
+            f"{'✅' if is_active else '⏸'} <code>{plan_id}</code> {kind}, {_plan_offset(offset)}"
+            f" — {', '.join(scope) or 'все записи'}\n"
+            f"<i>{html.escape(plan_text)}</i>\n\n"
+        )
+    text += "<code>/planoff id</code> — выключить, <code>/planon id</code> — включить"
+    await msg.answer(text, parse_mode="HTML")
+
+
+@router.message(Command("addplan"))
+async def cmd_add_plan(msg: types.Message, db: Database):
+    """Новый план: /addplan минуты вид [hall=N] [service=N] текст"""
+    if not is_admin(msg.from_user.id):
+        await msg.answer("🔐 Доступ запрещён.")
+        return
+
+    parts = msg.text.split(maxsplit=2)
+    if len(parts) < 3 or parts[2].split()[0] not in PLAN_KINDS:
+        await msg.answer(
+            "Использование:\n"
+            "<code>/addplan минуты вид [hall=N] [service=N] текст</code>\n"
+            "минуты — от начала визита, до визита со знаком минус (<code>-120</code>)\n"
+            "вид — <code>reminder</code> или <code>review</code>\n"
+            "В тексте можно использовать <code>{service}</code>, <code>{date}</code>, <code>{time}</code>.\n"
+            "Планы услуги заменяют для неё планы зала, а те — общие.",
+            parse_mode="HTML"
+        )
+        return
+
+    try:
+        offset = int(parts[1])
+    except ValueError:
+        await msg.answer("❌ Смещение — целое число минут")
+        return
+
+    kind, *rest = parts[2].split(maxsplit=1)
+    scope = {"hall": None, "service": None}
+    words = rest[0].split(" ") if rest else []
+    while words and "=" in words[0] and words[0].partition("=")[0] in scope:
+        key, _, value = words.pop(0).partition("=")
+        if not value.isdigit():
+            await msg.answer(f"❌ Неверный {key}: {html.escape(value)}", parse_mode="HTML")
+            return
+        scope[key] = int(value)
+    plan_text = " ".join(words).strip()
+    if not plan_text:
+        await msg.answer("❌ Нужен текст напоминания")
+        return
+
+    try:
+        plan_text.format(service="", date="", time="")
+    except (ValueError, IndexError, KeyError, AttributeError) as e:
+        await msg.answer(f"❌ Ошибка в тексте: {html.escape(str(e))}\n"
+                         "Фигурные скобки — только для {service}, {date}, {time}", parse_mode="HTML")
+        return
+
+    catalog = await db.get_catalog()
+    hall_id, service_id = scope["hall"], scope["service"]
+    if hall_id is not None and hall_id not in catalog.hall_names:
+        await msg.answer("❌ Зал не найден")
+        return
+    if service_id is not None and service_id not in catalog.services:
+        await msg.answer("❌ Услуга не найдена")
+        return
+
+    plan_id = await db.add_reminder_plan(offset, plan_text, kind, hall_id, service_id)
+    await msg.answer(
+        f"✅ План <code>{plan_id}</code>: {kind}, {_plan_offset(offset)}\n"
+        "Действует для новых записей.",
+        parse_mode="HTML"
+    )
+
+
+@router.message(Command("planon", "planoff"))
+async def cmd_plan_active(msg: types.Message, db: Database):
+    """Включить / выключить план напоминаний"""
+    if not is_admin(msg.from_user.id):
+        await msg.answer("🔐 Доступ запрещён.")
+        return
+
+    parts = msg.text.split()
+    command = parts[0].lstrip("/").split("@")[0]
+    if len(parts) < 2 or not parts[1].isdigit():
+        await msg.answer(f"Использование:\n<code>/{command} plan_id</code>", parse_mode="HTML")
+        return
+
+    active = command == "planon"
+    if not await db.set_reminder_plan_active(int(parts[1]), active):
+        await msg.answer("❌ План не найден")
+        return
+    await msg.answer(f"✅ План {parts[1]} {'включён' if active else 'выключен'}")
+
+
 @router.message(Command("blacklist"))
 async def cmd_blacklist(msg: types.Message, db: Database):
     if not is_admin(msg.from_user.id):
@@ -981,7 +1161,7 @@ async def admin_message_select_client(cb: types.CallbackQuery, db: Database, sta
     date = parts[2]
     
     # Получаем информацию о записи
-    async with aiosqlite.connect(db.db_path) as db_conn:
+    async with db.pool.read() as db_conn:
         cursor = await db_conn.execute(
             "SELECT id, user_id, name, phone, service_name, hall_id, date, time FROM bookings WHERE id = ?",
             (booking_id,)
@@ -1138,8 +1318,8 @@ async def admin_reviews(msg: types.Message, db: Database):
     if not is_admin(msg.from_user.id):
         return
 
-    stats = await db.get_average_rating()
-    rating_stats = await db.get_rating_stats()
+    stats = await db.get_review_stats()
+    rating_stats = stats["ratings"]
 
     text = f"⭐ <b>Управление отзывами</b>\n\n"
     text += f"Средний рейтинг: <b>{stats['avg']}/5</b>\n"
@@ -1162,21 +1342,30 @@ async def admin_reviews(msg: types.Message, db: Database):
     await msg.answer(text, reply_markup=kb, parse_mode="HTML")
 
 
-@router.callback_query(F.data == "admin_reviews_all")
-async def admin_reviews_all(cb: types.CallbackQuery, db: Database):
-    """Показать все отзывы админу"""
-    if not is_admin(cb.from_user.id):
-        await cb.answer("🔐 Доступ запрещён", show_alert=True)
-        return
+# Отзывов на странице админки
+ADMIN_REVIEWS_PAGE_SIZE = 10
+
 
-    reviews = await db.get_reviews(limit=20)
+async def show_admin_reviews(cb: types.CallbackQuery, db: Database, flt: str,
+                             before: tuple = None, after: tuple = None):
+    """Страница отзывов с фильтром: all — все, low — 1-3 звезды, 1..5 — одна оценка"""
+    if flt == "all":
+        page = await db.get_reviews_page(ADMIN_REVIEWS_PAGE_SIZE, before=before, after=after)
+        title = "Все отзывы"
+    elif flt == "low":
+        page = await db.get_reviews_page(ADMIN_REVIEWS_PAGE_SIZE, max_rating=3, before=before, after=after)
+        title = "Отзывы: 1-3 звезды (критические)"
+    else:
+        rating = int(flt)
+        page = await db.get_reviews_page(ADMIN_REVIEWS_PAGE_SIZE, rating=rating, before=before, after=after)
+        title = f"Отзывы: {rating} звёзд"
 
-    if not reviews:
+    if not page.rows:
         await cb.answer("📭 Нет отзывов", show_alert=True)
         return
 
-    text = "📋 <b>Все отзывы:</b>\n\n"
-    for r in reviews:
+    text = f"📋 <b>{title}:</b>\n\n"
+    for r in page.rows:
         rid, uid, name, rating, review_text, booking_id, created_at = r
         date = created_at.split("T")[0] if created_at else "?"
         stars = "⭐" * rating
@@ -1186,13 +1375,24 @@ async def admin_reviews_all(cb: types.CallbackQuery, db: Database):
             text += f"   «{review_text}»\n"
         text += f"   🗑 <code>/delreview {rid}</code>\n\n"
 
-    kb = InlineKeyboardMarkup(inline_keyboard=[
+    nav = reviews_nav_row(f"arv:{flt}", page)
+    kb = InlineKeyboardMarkup(inline_keyboard=([nav] if nav else []) + [
         [InlineKeyboardButton(text="🔙 Назад", callback_data="back_admin_reviews")]
     ])
 
     await cb.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
 
 
+@router.callback_query(F.data == "admin_reviews_all")
+async def admin_reviews_all(cb: types.CallbackQuery, db: Database):
+    """Все отзывы"""
+    if not is_admin(cb.from_user.id):
+        await cb.answer("🔐 Доступ запрещён", show_alert=True)
+        return
+
+    await show_admin_reviews(cb, db, "all")
+
+
 @router.callback_query(F.data.startswith("admin_reviews_filter:"))
 async def admin_reviews_filter(cb: types.CallbackQuery, db: Database):
     """Фильтр отзывов по оценке"""
@@ -1200,37 +1400,21 @@ async def admin_reviews_filter(cb: types.CallbackQuery, db: Database):
         await cb.answer("🔐 Доступ запрещён", show_alert=True)
         return
 
-    filter_val = cb.data.split(":")[1]
+    await show_admin_reviews(cb, db, cb.data.split(":")[1])
 
-    if filter_val == "low":
-        # Низкие оценки 1-3
-        reviews = await db.get_reviews(limit=20)
-        reviews = [r for r in reviews if r[3] <= 3]  # rating = index 3
-        filter_name = "1-3 звезды (критические)"
-    else:
-        rating = int(filter_val)
-        reviews = await db.get_reviews(limit=20, rating_filter=rating)
-        filter_name = f"{rating} звёзд"
 
-    if not reviews:
-        await cb.answer(f"📭 Нет отзывов с фильтром {filter_name}", show_alert=True)
+@router.callback_query(F.data.startswith("arv:"))
+async def admin_reviews_page(cb: types.CallbackQuery, db: Database):
+    """Листание: arv:<фильтр>:n:<курсор> — старее, arv:<фильтр>:p:<курсор> — новее"""
+    if not is_admin(cb.from_user.id):
+        await cb.answer("🔐 Доступ запрещён", show_alert=True)
         return
 
-    text = f"📋 <b>Отзывы: {filter_name}</b>\n\n"
-    for r in reviews:
-        rid, uid, name, rating, review_text, booking_id, created_at = r
-        date = created_at.split("T")[0] if created_at else "?"
-        stars = "⭐" * rating
-        text += f"{stars} <b>{name}</b> <i>({date})</i>\n"
-        if review_text:
-            text += f"   «{review_text}»\n"
-        text += f"   🗑 <code>/delreview {rid}</code>\n\n"
-
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔙 Назад", callback_data="back_admin_reviews")]
-    ])
-
-    await cb.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
+    _, flt, direction, value = cb.data.split(":", 3)
+    cursor = parse_review_cursor(value)
+    await show_admin_reviews(cb, db, flt,
+                             before=cursor if direction == "n" else None,
+                             after=cursor if direction == "p" else None)
 
 
 @router.callback_query(F.data == "admin_reviews_delete")
@@ -1255,8 +1439,8 @@ async def admin_reviews_back(cb: types.CallbackQuery, db: Database):
         await cb.answer("🔐 Доступ запрещён", show_alert=True)
         return
 
-    stats = await db.get_average_rating()
-    rating_stats = await db.get_rating_stats()
+    stats = await db.get_review_stats()
+    rating_stats = stats["ratings"]
 
     text = f"⭐ <b>Управление отзывами</b>\n\n"
     text += f"Средний рейтинг: <b>{stats['avg']}/5</b>\n"
@@ -1301,16 +1485,10 @@ async def admin_delete_review(msg: types.Message, db: Database):
         await msg.answer("❌ Неверный ID (должно быть число)")
         return
 
-    # Проверяем существование
-    reviews = await db.get_reviews(limit=100)
-    review_exists = any(r[0] == review_id for r in reviews)
-
-    if not review_exists:
+    if not await db.delete_review(review_id):
         await msg.answer("❌ Отзыв с таким ID не найден")
         return
 
-    await db.delete_review(review_id)
-
     await msg.answer(
         f"✅ Отзыв <code>{review_id}</code> удалён",
         parse_mode="HTML"
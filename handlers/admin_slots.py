@@ -3,7 +3,7 @@ from aiogram import Router, F, types
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from config.settings import get_settings
 from database.db import Database
-import aiosqlite
+from database.slots import get_slot_grid
 
 router = Router()
 settings = get_settings()
@@ -25,11 +25,11 @@ async def open_slots(cb: types.CallbackQuery, db: Database):
     hall_id = int(parts[2])
     
     hall_name = await db.get_hall_name(hall_id)
-    slots = await db.get_available_slots(date, hall_id)
-    all_slots = [f"{h:02d}:00" for h in range(10, 20)]
+    slots = set(await db.get_available_slots(date, hall_id))
+    all_slots = get_slot_grid().times
     
     # Получаем записи
-    async with aiosqlite.connect(db.db_path) as db_conn:
+    async with db.pool.read() as db_conn:
         cursor = await db_conn.execute(
             "SELECT time, name FROM bookings WHERE date = ? AND hall_id = ?",
             (date, hall_id)
@@ -78,7 +78,7 @@ async def toggle_slot(cb: types.CallbackQuery, db: Database):
     time_idx = int(parts[2])
     hall_id = int(parts[3])
     
-    all_slots = [f"{h:02d}:00" for h in range(10, 20)]
+    all_slots = get_slot_grid().times
     time = all_slots[time_idx]
     
     available = await db.get_available_slots(date, hall_id)
@@ -92,7 +92,7 @@ async def toggle_slot(cb: types.CallbackQuery, db: Database):
 
 
 @router.callback_query(F.data.startswith("aban:"))
-async def ban_from_slot(cb: types.CallbackQuery, db: Database):
+async def ban_from_slot(cb: types.CallbackQuery, db: Database, scheduler):
     """Забанить клиента из записи"""
     if not is_admin(cb.from_user.id):
         await cb.answer("🔐", show_alert=True)
@@ -102,7 +102,8 @@ async def ban_from_slot(cb: types.CallbackQuery, db: Database):
     user_id = int(user_id)
     
     await db.add_to_blacklist(user_id, "Проблемный клиент")
-    await db.cancel_booking(int(bid))
+    if await db.cancel_booking(int(bid)):
+        scheduler.cancel(int(bid))
     
     # Отвечаем на callback
     await cb.answer(f"✅ Забанен", show_alert=True)
@@ -162,11 +163,11 @@ async def view_booking(cb: types.CallbackQuery, db: Database):
     time_idx = int(parts[2])
     hall_id = int(parts[3])
     
-    all_slots = [f"{h:02d}:00" for h in range(10, 20)]
+    all_slots = get_slot_grid().times
     time = all_slots[time_idx]
     hall_name = await db.get_hall_name(hall_id)
     
-    async with aiosqlite.connect(db.db_path) as db_conn:
+    async with db.pool.read() as db_conn:
         cursor = await db_conn.execute(
             "SELECT id, user_id, name, phone, service_name FROM bookings WHERE date = ? AND time = ? AND hall_id = ?",
             (date, time, hall_id)
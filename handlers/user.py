@@ -8,20 +8,19 @@ from config.settings import get_settings
 from database.db import Database
 from keyboards.main import (
     main_menu_kb, portfolio_kb, confirm_kb,
-    halls_kb, services_kb, subscription_kb, masters_kb
+    halls_kb, services_kb, subscription_kb, masters_kb,
+    parse_review_cursor, reviews_nav_row
 )
-from keyboards.booking import calendar_kb, slots_kb
+from keyboards.booking import calendar_kb, slots_kb, nearest_kb
 from utils.scheduler import ReminderScheduler
-from datetime import datetime
-import pytz
+from utils.sender import SendQueue
+from utils.outbox import OutboxRelay
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = Router()
 settings = get_settings()
-tz = pytz.timezone(settings["TIMEZONE"])
 
 
 class BookingFSM(StatesGroup):
@@ -128,22 +127,22 @@ async def save_review_rating(msg_or_cb, state: FSMContext, db: Database, rating:
 
 
 @router.callback_query(F.data == "review_skip_text")
-async def review_skip_text(cb: types.CallbackQuery, state: FSMContext, db: Database):
+async def review_skip_text(cb: types.CallbackQuery, state: FSMContext, db: Database, sender: SendQueue):
     """Пропуск текста отзыва"""
-    await save_review(cb, state, db, "")
+    await save_review(cb, state, db, sender, "")
 
 
 @router.message(ReviewFSM.text)
-async def review_text_input(msg: types.Message, state: FSMContext, db: Database):
+async def review_text_input(msg: types.Message, state: FSMContext, db: Database, sender: SendQueue):
     """Ввод текста отзыва"""
     if msg.text.lower() in ["пропустить", "skip", "нет"]:
-        await save_review(msg, state, db, "")
+        await save_review(msg, state, db, sender, "")
         return
     
-    await save_review(msg, state, db, msg.text.strip())
+    await save_review(msg, state, db, sender, msg.text.strip())
 
 
-async def save_review(msg_or_cb, state: FSMContext, db: Database, text: str):
+async def save_review(msg_or_cb, state: FSMContext, db: Database, sender: SendQueue, text: str):
     """Сохранение отзыва в базу"""
     data = await state.get_data()
     rating = data.get("rating", 5)
@@ -179,18 +178,15 @@ async def save_review(msg_or_cb, state: FSMContext, db: Database, text: str):
     # Уведомление админам о новом отзыве
     if rating <= 3:  # Только если оценка низкая
         for aid in settings["ADMIN_IDS"]:
-            try:
-                await msg_or_cb.bot.send_message(
-                    aid,
-                    f"⚠️ <b>Новый отзыв (оценка {rating}/5)</b>\n\n"
-                    f"👤 {name}\n"
-                    f"🆔 <code>{user_id}</code>\n"
-                    f"{'⭐' * rating}\n"
-                    f"Комментарий: {text or 'Без комментария'}",
-                    parse_mode="HTML"
-                )
-            except:
-                pass
+            sender.send(
+                aid,
+                f"⚠️ <b>Новый отзыв (оценка {rating}/5)</b>\n\n"
+                f"👤 {name}\n"
+                f"🆔 <code>{user_id}</code>\n"
+                f"{'⭐' * rating}\n"
+                f"Комментарий: {text or 'Без комментария'}",
+                parse_mode="HTML"
+            )
 
 
 @router.callback_query(F.data == "review_cancel")
@@ -200,19 +196,31 @@ async def review_cancel(cb: types.CallbackQuery, state: FSMContext):
     await cb.message.edit_text("❌ Отзыв не отправлен.", reply_markup=main_menu_kb())
 
 
-async def show_reviews(msg: types.Message, db: Database, page: int = 0):
+# Отзывов на странице ленты
+REVIEWS_PAGE_SIZE = 5
+
+
+async def show_reviews(msg: types.Message, db: Database):
     """Показать ленту отзывов"""
-    reviews = await db.get_reviews(limit=10)
-    stats = await db.get_average_rating()
-    rating_stats = await db.get_rating_stats()
-    
-    if not reviews:
+    feed = await reviews_feed(db)
+    if not feed:
         await msg.answer(
             "📭 <b>Пока нет отзывов</b>\n\n"
             "Будьте первыми — оставьте отзыв о нашем салоне!",
             parse_mode="HTML"
         )
         return
+    text, kb = feed
+    await msg.answer(text, reply_markup=kb, parse_mode="HTML")
+
+
+async def reviews_feed(db: Database, before: tuple = None, after: tuple = None):
+    """Текст и клавиатура страницы ленты; None — отзывов нет"""
+    page = await db.get_reviews_page(REVIEWS_PAGE_SIZE, before=before, after=after)
+    if not page.rows:
+        return None
+    stats = await db.get_review_stats()
+    rating_stats = stats["ratings"]
     
     # Статистика
     text = f"⭐ <b>Отзывы о салоне</b>\n\n"
@@ -227,8 +235,8 @@ async def show_reviews(msg: types.Message, db: Database, page: int = 0):
     
     text += "\n" + "─" * 20 + "\n\n"
     
-    # Последние отзывы
-    for r in reviews[:5]:
+    # Отзывы страницы
+    for r in page.rows:
         rid, uid, name, rating, review_text, booking_id, created_at = r
         date = created_at.split("T")[0] if created_at else "?"
         stars = "⭐" * rating
@@ -240,12 +248,12 @@ async def show_reviews(msg: types.Message, db: Database, page: int = 0):
             text += f"   {review_text}\n"
         text += "\n"
     
-    kb = InlineKeyboardMarkup(inline_keyboard=[
+    nav = reviews_nav_row("rv", page)
+    kb = InlineKeyboardMarkup(inline_keyboard=([nav] if nav else []) + [
         [InlineKeyboardButton(text="⭐ Оставить отзыв", callback_data="review_start")],
         [InlineKeyboardButton(text="🔙 В меню", callback_data="back_main_menu")]
     ])
-    
-    await msg.answer(text, reply_markup=kb, parse_mode="HTML")
+    return text, kb
 
 
 @router.callback_query(F.data == "reviews_all")
@@ -254,6 +262,23 @@ async def reviews_all_callback(cb: types.CallbackQuery, db: Database):
     await show_reviews(cb.message, db)
 
 
+@router.callback_query(F.data.startswith("rv:"))
+async def reviews_page_callback(cb: types.CallbackQuery, db: Database):
+    """Листание ленты: rv:n:<курсор> — старее, rv:p:<курсор> — новее"""
+    _, direction, value = cb.data.split(":", 2)
+    cursor = parse_review_cursor(value)
+    feed = await reviews_feed(db, before=cursor if direction == "n" else None,
+                              after=cursor if direction == "p" else None)
+    if not feed:
+        # Страницу удалили целиком — возвращаемся к началу
+        feed = await reviews_feed(db)
+    if not feed:
+        await cb.answer("📭 Пока нет отзывов", show_alert=True)
+        return
+    text, kb = feed
+    await cb.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
+
+
 @router.callback_query(F.data == "review_start")
 async def review_start_callback(cb: types.CallbackQuery, state: FSMContext):
     """Начать оставление отзыва"""
@@ -290,28 +315,9 @@ async def back_to_main_menu(cb: types.CallbackQuery, state: FSMContext):
 
 @router.message(F.text == "💰 Прайсы")
 async def prices(msg: types.Message, db: Database):
-    halls = await db.get_halls()
-    text = "<b>💰 Прайс-лист</b>\n\n"
-
-    for hall_id, hall_name in halls:
-        text += f"<b>{hall_name}:</b>\n"
-        # Получаем мастеров для этого зала
-        masters = await db.get_masters_by_hall(hall_id)
-        if len(masters) > 1:
-            # Показываем мастеров для зала
-            for mid, mname in masters:
-                text += f"  👤 {mname}:\n"
-                services = await db.get_services_by_hall(hall_id)
-                for svc_id, name, price, duration in services:
-                    text += f"    • {name} — {price}₽ ({duration} мин)\n"
-        else:
-            services = await db.get_services_by_hall(hall_id)
-            for svc_id, name, price, duration in services:
-                text += f"  • {name} — {price}₽ ({duration} мин)\n"
-        text += "\n"
-
-    text += "<i>Цены актуальны на момент записи</i>"
-    await msg.answer(text, parse_mode="HTML")
+    # Текст хранится в снимке справочников и перерисовывается только с новым снимком
+    catalog = await db.get_catalog()
+    await msg.answer(catalog.price_list(), parse_mode="HTML")
 
 
 @router.message(F.text == "🖼 Портфолио")
@@ -363,7 +369,7 @@ async def on_hall(cb: types.CallbackQuery, state: FSMContext, db: Database):
     if len(masters) == 1:
         master_id, master_name = masters[0]
         await state.update_data(master_id=master_id, master_name=master_name)
-        services = await db.get_services_by_hall(hall_id)
+        services = await db.get_services_by_hall(hall_id, master_id)
         await state.set_state(BookingFSM.service)
         await cb.message.edit_text(
             f"💅 <b>Выберите услугу:</b>\n🏛 {hall_name}",
@@ -395,7 +401,7 @@ async def on_master(cb: types.CallbackQuery, state: FSMContext, db: Database):
     master_name = await db.get_master_name(master_id)
     await state.update_data(master_id=master_id, master_name=master_name)
 
-    services = await db.get_services_by_hall(hall_id)
+    services = await db.get_services_by_hall(hall_id, master_id)
     await state.set_state(BookingFSM.service)
     await cb.message.edit_text(
         f"💇 <b>Выберите услугу:</b>\n🏛 {hall_name}, 👤 {master_name}",
@@ -419,7 +425,7 @@ async def on_service(cb: types.CallbackQuery, state: FSMContext, db: Database):
     data = await state.get_data()
     master_id = data.get('master_id')
 
-    service = await db.get_service(service_id)
+    service = await db.get_service(service_id, master_id)
     if not service:
         await cb.answer("❌ Услуга не найдена", show_alert=True)
         return
@@ -433,18 +439,63 @@ async def on_service(cb: types.CallbackQuery, state: FSMContext, db: Database):
     )
 
     await state.set_state(BookingFSM.date)
-    dates = await db.get_working_days(90)  # Увеличили с 30 до 90 дней
-    if not dates:
+    # Только дни, где у мастера помещается услуга, с числом окон
+    days = await db.get_bookable_days(master_id, duration, 90)
+    if not days:
         await cb.answer("🚫 Нет свободных дат", show_alert=True)
         return
 
     await cb.message.edit_text(
         f"📅 <b>Выберите дату:</b>\n💇 {svc_name} ({price}₽)",
-        reply_markup=calendar_kb(dates),
+        reply_markup=calendar_kb(list(days), nearest=True, counts=days),
         parse_mode="HTML"
     )
 
 
+@router.callback_query(F.data == "nearest")
+async def on_nearest(cb: types.CallbackQuery, state: FSMContext, db: Database):
+    """Ближайшие свободные окна под выбранную услугу у всех мастеров зала"""
+    data = await state.get_data()
+    hall_id = data.get('hall_id')
+    if not hall_id or not data.get('service_id'):
+        await cb.answer("❌ Начните запись заново", show_alert=True)
+        return
+
+    windows = await db.find_earliest(hall_id, data.get('duration'), limit=6)
+    if not windows:
+        await cb.answer("🚫 Нет свободного времени", show_alert=True)
+        return
+
+    await state.set_state(BookingFSM.time)
+    await cb.message.edit_text(
+        f"⚡ <b>Ближайшее свободное время:</b>\n💇 {data['service_name']}",
+        reply_markup=nearest_kb(windows),
+        parse_mode="HTML"
+    )
+
+
+@router.callback_query(F.data.startswith("nslot:"))
+async def on_nearest_slot(cb: types.CallbackQuery, state: FSMContext, db: Database):
+    data = await state.get_data()
+    if not data.get('service_id'):
+        # Старая кнопка: состояние уже сброшено или истекло
+        await cb.answer("❌ Начните запись заново", show_alert=True)
+        return
+
+    _, master_id, date, time = cb.data.split(":", 3)
+    master_id = int(master_id)
+    master_name = await db.get_master_name(master_id)
+    # Окно может быть у другого мастера — цена тоже его
+    service = await db.get_service(data['service_id'], master_id)
+    if not service:
+        await cb.answer("❌ Услуга не найдена", show_alert=True)
+        return
+    await state.update_data(master_id=master_id, master_name=master_name, date=date, time=time,
+                            price=service[2])
+    await state.set_state(BookingFSM.name)
+    await cb.message.edit_text("✍️ <b>Ваше имя:</b>", parse_mode="HTML")
+
+
 @router.callback_query(F.data.startswith("date:"))
 async def on_date(cb: types.CallbackQuery, state: FSMContext, db: Database):
     data = await state.get_data()
@@ -452,12 +503,10 @@ async def on_date(cb: types.CallbackQuery, state: FSMContext, db: Database):
     date = cb.data.split(":")[1]
     await state.update_data(date=date)
 
-    slots = await db.get_available_slots(date, master_id)
-    
-    # Отладка: логируем количество слотов
-    import logging
-    logging.info(f"Дата: {date}, Мастер: {master_id}, Слотов: {len(slots)}")
-    
+    # Только те начала, где услуга помещается целиком
+    slots = await db.get_available_slots(date, master_id, data.get('duration'))
+    logger.debug("Дата: %s, Мастер: %s, Слотов: %s", date, master_id, len(slots))
+
     if not slots:
         await cb.answer(f"❌ Нет слотов на {date}", show_alert=True)
         return
@@ -513,58 +562,32 @@ async def on_phone(msg: types.Message, state: FSMContext):
 
 
 @router.callback_query(F.data == "confirm")
-async def on_confirm(cb: types.CallbackQuery, state: FSMContext, db: Database, scheduler: ReminderScheduler):
+async def on_confirm(cb: types.CallbackQuery, state: FSMContext, db: Database,
+                     scheduler: ReminderScheduler, outbox: OutboxRelay):
     data = await state.get_data()
     uid = cb.from_user.id
 
-    ok = await db.book_slot(data["date"], data["time"], data["master_id"], uid)
-    if not ok:
-        await cb.answer("❌ Слот только что заняли", show_alert=True)
-        await state.clear()
-        dates = await db.get_working_days(30)
-        await cb.message.edit_text("📅 Выберите дату:", reply_markup=calendar_kb(dates))
-        return
-
-    bid = await db.create_booking(
+    # Слот, запись, напоминание и уведомления (outbox) — одной транзакцией
+    result = await db.commit_booking(
         uid, data["name"], data["phone"],
         data["service_id"], data["service_name"],
         data["hall_id"], data["hall_name"],
         data["master_id"], data.get("master_name", ""),
-        data["date"], data["time"]
-    )
-
-    # Напоминание
-    appt = datetime.strptime(f"{data['date']} {data['time']}", "%Y-%m-%d %H:%M")
-    appt = tz.localize(appt)
-    await scheduler.add(
-        bid, uid, data["name"], data["service_name"],
-        data["date"], data["time"], appt
+        data["date"], data["time"],
+        duration=data.get("duration"),
+        notifications=booking_notifications(data, uid)
     )
+    if not result.ok:
+        await cb.answer("❌ Слот только что заняли", show_alert=True)
+        await state.clear()
+        dates = await db.get_working_days(30)
+        await cb.message.edit_text("📅 Выберите дату:", reply_markup=calendar_kb(dates))
+        return
 
-    # Уведомление админу
-    master_info = f"👤 {data.get('master_name', '')}\n" if data.get('master_name') else ""
-    for aid in settings["ADMIN_IDS"]:
-        await cb.bot.send_message(aid,
-            f"🔔 <b>Новая запись!</b>\n\n"
-            f"🏛 {data['hall_name']}\n"
-            f"{master_info}"
-            f"💇 {data['service_name']}\n"
-            f"👤 {data['name']} ({data['phone']})\n"
-            f"📅 {data['date']} {data['time']}\n"
-            f"💰 {data['price']}₽\n"
-            f"🆔 {uid}",
-            parse_mode="HTML")
-
-    # В канал
-    if settings["CHANNEL_ID"]:
-        try:
-            master_info_channel = f", {data.get('master_name', '')}" if data.get('master_name') else ""
-            await cb.bot.send_message(settings["CHANNEL_ID"],
-                f"✨ Запись на {data['date']} {data['time']} подтверждена!\n"
-                f"🏛 {data['hall_name']}{master_info_channel}, 💇 {data['service_name']}",
-                parse_mode="HTML")
-        except:
-            pass
+    # Сначала — подтверждение клиенту, уведомления уйдут в фоне
+    await state.clear()
+    outbox.wake()
+    scheduler.track(result.booking_id, result.reminders)
 
     await cb.message.answer(
         f"✅ <b>Запись подтверждена!</b>\n\n"
@@ -575,7 +598,34 @@ async def on_confirm(cb: types.CallbackQuery, state: FSMContext, db: Database, s
         f"Ждём вас! 💅",
         reply_markup=main_menu_kb(), parse_mode="HTML"
     )
-    await state.clear()
+
+
+def booking_notifications(data: dict, uid: int):
+    """Уведомления о новой записи: админам и в канал — [(chat_id, text), ...]"""
+    notifications = []
+
+    master_info = f"👤 {data.get('master_name', '')}\n" if data.get('master_name') else ""
+    admin_text = (
+        f"🔔 <b>Новая запись!</b>\n\n"
+        f"🏛 {data['hall_name']}\n"
+        f"{master_info}"
+        f"💇 {data['service_name']}\n"
+        f"👤 {data['name']} ({data['phone']})\n"
+        f"📅 {data['date']} {data['time']}\n"
+        f"💰 {data['price']}₽\n"
+        f"🆔 {uid}"
+    )
+    for aid in settings["ADMIN_IDS"]:
+        notifications.append((aid, admin_text))
+
+    if settings["CHANNEL_ID"]:
+        master_info_channel = f", {data.get('master_name', '')}" if data.get('master_name') else ""
+        notifications.append((
+            settings["CHANNEL_ID"],
+            f"✨ Запись на {data['date']} {data['time']} подтверждена!\n"
+            f"🏛 {data['hall_name']}{master_info_channel}, 💇 {data['service_name']}"
+        ))
+    return notifications
 
 
 @router.callback_query(F.data == "cancel")
@@ -599,15 +649,15 @@ async def back_halls(cb: types.CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("cal:"))
 async def cal_page(cb: types.CallbackQuery, state: FSMContext, db: Database):
     page = int(cb.data.split(":")[1])
-    dates = await db.get_working_days(90)  # Увеличили с 30 до 90 дней
-    await cb.message.edit_text("📅 Выберите дату:", reply_markup=calendar_kb(dates, page))
+    data = await state.get_data()
+    days = await db.get_bookable_days(data.get('master_id'), data.get('duration'), 90)
+    await cb.message.edit_text("📅 Выберите дату:", reply_markup=calendar_kb(list(days), page, nearest=True, counts=days))
 
 
 @router.message(F.text == "🗓 Мои записи")
 async def my_bookings(msg: types.Message, db: Database):
-    logger.info(f"Мои записи: user_id={msg.from_user.id}")
     b = await db.get_user_active_booking(msg.from_user.id)
-    logger.info(f"Запись найдена: {b}")
+    logger.debug("Мои записи: user_id=%s, запись %s", msg.from_user.id, b["id"] if b else None)
     if not b:
         await msg.answer("📭 Нет активных записей.", reply_markup=main_menu_kb())
         return
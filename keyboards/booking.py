@@ -1,38 +1,64 @@
 # keyboards/booking.py
+from functools import lru_cache
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from datetime import datetime, timedelta
+from database.slots import get_slot_grid
 
+# Разметки неизменяемы (frozen pydantic), поэтому одну и ту же можно
+# отдавать повторно. Кэш ключуется кортежем входов: неделя календаря,
+# маска свободных слотов, месяц с отмеченными датами.
+KB_CACHE_SIZE = 512
 
-def calendar_kb(dates: list, page: int = 0):
+
+@lru_cache(maxsize=1024)
+def _day_label(d: str):
+    """("Пн", 19) для даты YYYY-MM-DD — strptime один раз на дату"""
+    dt = datetime.strptime(d, "%Y-%m-%d")
+    return dt.strftime("%a")[:2], dt.day
+
+
+def calendar_kb(dates: list, page: int = 0, nearest: bool = False, counts: dict = None):
     """Календарь с пагинацией по неделям (для записи клиентов)
     
-    Показывает по 7 дней на странице с навигацией
+    Показывает по 7 дней на странице с навигацией.
+    nearest=True — кнопка «Ближайшее время» над календарём
+    counts — {дата: свободных окон}, число показывается на кнопке дня
     """
-    # Разбиваем на недели по 7 дней
-    weeks = [dates[i:i+7] for i in range(0, len(dates), 7)]
-    
-    if not weeks:
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="📭 Нет свободных дат", callback_data="empty")],
-            [InlineKeyboardButton(text="🔙 Назад", callback_data="back_main")]
-        ])
+    if not dates:
+        return _empty_calendar_kb()
+
+    # Разбиваем на недели по 7 дней; строится только показанная
+    pages = -(-len(dates) // 7)
+    page = max(0, min(page, pages - 1))
+    week = tuple(dates[page * 7:page * 7 + 7])
+    week_counts = tuple(counts[d] for d in week) if counts is not None else None
+    return _calendar_week_kb(week, week_counts, page, page < pages - 1, nearest)
 
-    page = max(0, min(page, len(weeks) - 1))
-    week = weeks[page]
 
+@lru_cache()
+def _empty_calendar_kb():
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="📭 Нет свободных дат", callback_data="empty")],
+        [InlineKeyboardButton(text="🔙 Назад", callback_data="back_main")]
+    ])
+
+
+@lru_cache(maxsize=KB_CACHE_SIZE)
+def _calendar_week_kb(week: tuple, counts: tuple, page: int, has_next: bool, nearest: bool):
     keyboard = []
+    if nearest:
+        keyboard.append([InlineKeyboardButton(text="⚡ Ближайшее время", callback_data="nearest")])
     row = []
-    for d in week:
-        dt = datetime.strptime(d, "%Y-%m-%d")
-        day = dt.strftime("%a")[:2]
-        num = dt.day
-        row.append(InlineKeyboardButton(text=f"{day}\n{num}", callback_data=f"date:{d}"))
+    for i, d in enumerate(week):
+        day, num = _day_label(d)
+        text = f"{day}\n{num}" if counts is None else f"{day}\n{num} ({counts[i]})"
+        row.append(InlineKeyboardButton(text=text, callback_data=f"date:{d}"))
     keyboard.append(row)
 
     nav = []
     if page > 0:
         nav.append(InlineKeyboardButton(text="⬅️", callback_data=f"cal:{page-1}"))
-    if page < len(weeks) - 1:
+    if has_next:
         nav.append(InlineKeyboardButton(text="➡️", callback_data=f"cal:{page+1}"))
     nav.append(InlineKeyboardButton(text="🔙 Назад", callback_data="back_main"))
     keyboard.append(nav)
@@ -40,16 +66,34 @@ def calendar_kb(dates: list, page: int = 0):
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
+def nearest_kb(windows: list):
+    """Ближайшие свободные окна: [(date, time, master_id, master_name), ...]"""
+    kb = []
+    for date, time, master_id, master_name in windows:
+        dt = datetime.strptime(date, "%Y-%m-%d")
+        kb.append([InlineKeyboardButton(
+            text=f"{dt.strftime('%d.%m')} {time} · {master_name}",
+            callback_data=f"nslot:{master_id}:{date}:{time}"
+        )])
+    kb.append([InlineKeyboardButton(text="📅 Выбрать дату", callback_data="cal:0")])
+    return InlineKeyboardMarkup(inline_keyboard=kb)
+
+
 def slots_kb(slots: list, date: str):
     """Выбор времени в виде сетки кнопок"""
+    return _slots_kb(get_slot_grid().mask(slots), date)
+
+
+@lru_cache(maxsize=KB_CACHE_SIZE)
+def _slots_kb(free: int, date: str):
     kb = []
     row = []
     
     # Все возможные слоты
-    all_slots = [f"{h:02d}:00" for h in range(10, 20)]
+    grid = get_slot_grid()
     
-    for t in all_slots:
-        if t in slots:
+    for t in grid.times:
+        if free & grid.bit(t):
             row.append(InlineKeyboardButton(
                 text=f"⏰ {t}",
                 callback_data=f"slot:{date}:{t}"
@@ -80,15 +124,20 @@ def add_day_calendar_kb(selected_dates: list = None, year: int = None, month: in
     selected_dates: список уже добавленных дат (YYYY-MM-DD)
     year, month: год и месяц для отображения (по умолчанию текущий месяц)
     """
-    if selected_dates is None:
-        selected_dates = []
-    
     now = datetime.now()
     if year is None:
         year = now.year
     if month is None:
         month = now.month
-    
+
+    # В ключ кэша — только даты этого месяца
+    prefix = f"{year}-{month:02d}-"
+    selected = frozenset(d for d in selected_dates or () if d.startswith(prefix))
+    return _month_kb(year, month, selected, now.date())
+
+
+@lru_cache(maxsize=KB_CACHE_SIZE)
+def _month_kb(year: int, month: int, selected_dates: frozenset, today):
     keyboard = []
     
     # Заголовок с месяцем и годом + навигация
@@ -122,7 +171,6 @@ def add_day_calendar_kb(selected_dates: list = None, year: int = None, month: in
         rows.append(InlineKeyboardButton(text="⬜", callback_data="cal_empty_none"))
     
     # Дни месяца
-    today = datetime.now().date()
     for day in range(1, days_in_month + 1):
         date_str = f"{year}-{month:02d}-{day:02d}"
         # Проверяем, добавлена ли дата
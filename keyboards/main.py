@@ -1,10 +1,14 @@
 # keyboards/main.py
+from functools import lru_cache
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 from config.settings import get_settings
 
 settings = get_settings()
 
 
+# Клавиатуры без параметров неизменяемы (frozen pydantic) —
+# строятся один раз и отдаются всем
+@lru_cache()
 def main_menu_kb():
     kb = [
         [KeyboardButton(text="📅 Записаться"), KeyboardButton(text="💰 Прайсы")],
@@ -14,6 +18,7 @@ def main_menu_kb():
     return ReplyKeyboardMarkup(keyboard=kb, resize_keyboard=True)
 
 
+@lru_cache()
 def admin_menu_kb():
     kb = [
         [KeyboardButton(text="➕ Добавить день"), KeyboardButton(text="❌ Закрыть день")],
@@ -27,6 +32,7 @@ def admin_menu_kb():
     return ReplyKeyboardMarkup(keyboard=kb, resize_keyboard=True)
 
 
+@lru_cache()
 def back_kb():
     return ReplyKeyboardMarkup(
         keyboard=[[KeyboardButton(text="🔙 Назад")]],
@@ -34,6 +40,7 @@ def back_kb():
     )
 
 
+@lru_cache()
 def portfolio_kb():
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(
@@ -43,6 +50,7 @@ def portfolio_kb():
     ])
 
 
+@lru_cache()
 def confirm_kb():
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="✅ Подтвердить", callback_data="confirm")],
@@ -50,6 +58,34 @@ def confirm_kb():
     ])
 
 
+@lru_cache()
+def review_request_kb():
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="⭐ Оставить отзыв", callback_data="review_start")]
+    ])
+
+
+def review_cursor(key: tuple) -> str:
+    """Курсор ленты отзывов (created_at, id) для callback_data"""
+    return f"{key[0]}|{key[1]}"
+
+
+def parse_review_cursor(value: str) -> tuple:
+    created_at, _, review_id = value.rpartition("|")
+    return created_at, int(review_id)
+
+
+def reviews_nav_row(prefix: str, page) -> list:
+    """Кнопки листания ReviewPage: {prefix}:p:<курсор> — новее, {prefix}:n:<курсор> — старее"""
+    row = []
+    if page.newer:
+        row.append(InlineKeyboardButton(text="⬅️ Новее", callback_data=f"{prefix}:p:{review_cursor(page.newer)}"))
+    if page.older:
+        row.append(InlineKeyboardButton(text="Старее ➡️", callback_data=f"{prefix}:n:{review_cursor(page.older)}"))
+    return row
+
+
+@lru_cache()
 def subscription_kb():
     link = settings["CHANNEL_LINK"]
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -58,6 +94,7 @@ def subscription_kb():
     ])
 
 
+@lru_cache()
 def halls_kb():
     """Выбор зала"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -17,13 +17,9 @@ class SubscriptionMiddleware(BaseMiddleware):
             return await handler(event, data)
 
         bot = data.get("bot")
-        if bot and settings["CHANNEL_ID"]:
-            try:
-                member = await bot.get_chat_member(settings["CHANNEL_ID"], user_id)
-                if member.status not in ["member", "administrator", "creator"]:
-                    await self._ask_sub(event)
-                    return
-            except:
+        subscriptions = data.get("subscriptions")
+        if bot and subscriptions and settings["CHANNEL_ID"]:
+            if not await subscriptions.is_subscribed(bot, user_id):
                 await self._ask_sub(event)
                 return
         return await handler(event, data)
@@ -0,0 +1,153 @@
+# utils/logs.py
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+# Апдейт, который сейчас обрабатывается (ставит context_middleware)
+update_id_var = contextvars.ContextVar("update_id", default=None)
+user_id_var = contextvars.ContextVar("user_id", default=None)
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+
+class ContextFilter(logging.Filter):
+    """Добавить к записи update_id и user_id текущего апдейта"""
+
+    def filter(self, record):
+        record.update_id = update_id_var.get()
+        record.user_id = user_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускать только долю записей болтливых логгеров
+
+    rates: {"handlers.user": 0.1} — действует на логгер и его потомков.
+    WARNING и выше проходят всегда.
+    """
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+        self._cache = {}  # имя логгера -> доля
+
+    def _rate(self, name: str) -> float:
+        rate = self._cache.get(name)
+        if rate is None:
+            rate = 1.0
+            for prefix, value in self.rates.items():
+                if name == prefix or name.startswith(prefix + "."):
+                    rate = value
+            self._cache[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        update_id = getattr(record, "update_id", None)
+        if update_id is not None:
+            entry["update_id"] = update_id
+        user_id = getattr(record, "user_id", None)
+        if user_id is not None:
+            entry["user_id"] = user_id
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler с ограниченной очередью: при переполнении запись отбрасывается"""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # Сообщение и traceback — строками сразу: аргументы могут измениться,
+        # пока запись ждёт в очереди; форматирование — уже в потоке listener
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_sample(value: str) -> dict:
+    """"handlers.user=0.1,handlers.admin=0.5" -> {"handlers.user": 0.1, ...}"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+def setup_logging(path: str, level: str = "INFO", fmt: str = "text", max_bytes: int = 10 * 2**20,
+                  backups: int = 5, sample: dict = None, queue_size: int = 10000):
+    """Корневой логгер пишет в очередь; файл и консоль — в потоке QueueListener
+
+    Вызов logger.info() в event loop только кладёт запись в очередь,
+    диск не трогает. Файл ротируется по размеру (max_bytes, backups).
+    Возвращает запущенный listener — остановить при выходе.
+    """
+    formatter = JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT)
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+    )
+    file_handler.setFormatter(formatter)
+    console_handler = logging.StreamHandler(sys.stderr)
+    console_handler.setFormatter(formatter)
+
+    records = queue.Queue(maxsize=queue_size)
+    queue_handler = DroppingQueueHandler(records)
+    if sample:
+        queue_handler.addFilter(SamplingFilter(sample))
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(records, file_handler, console_handler)
+    listener.start()
+    return listener
+
+
+async def context_middleware(handler, event, data):
+    """Outer middleware апдейтов: update_id и user_id для записей лога"""
+    user = data.get("event_from_user")
+    update_token = update_id_var.set(event.update_id)
+    user_token = user_id_var.set(user.id if user else None)
+    try:
+        return await handler(event, data)
+    finally:
+        update_id_var.reset(update_token)
+        user_id_var.reset(user_token)
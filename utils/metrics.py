@@ -0,0 +1,303 @@
+# utils/metrics.py
+import bisect
+import functools
+import inspect
+import logging
+import time
+
+from aiohttp import web
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм, секунды
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ===== Метрики =====
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._values = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        return [f"{self.name}{_labels(self.labels, k)} {_number(v)}" for k, v in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [счётчики корзин..., +Inf, сумма]
+
+    def observe(self, value: float, *labels):
+        row = self._values.get(labels)
+        if row is None:
+            row = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        row[bisect.bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = []
+        for k, row in sorted(self._values.items()):
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"),), row):
+                total += count
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labels, k, [le])} {total}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, k)} {_number(row[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labels, k)} {total}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class Callback(_Metric):
+    """Значения считаются при выгрузке: fn() -> число или {значения меток: число}"""
+
+    def __init__(self, name, help, type: str = "gauge", labels=(), fn=None):
+        super().__init__(name, help, labels)
+        self.type = type
+        self.fn = fn
+
+    def render(self):
+        try:
+            values = self.fn()
+        except Exception:
+            logger.exception(f"Метрика {self.name}: ошибка сбора")
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [
+            f"{self.name}{_labels(self.labels, k if isinstance(k, tuple) else (k,))} {_number(v)}"
+            for k, v in values.items()
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _get(self, cls, name, *args, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, *args, **kwargs)
+        return metric
+
+    def counter(self, name, help, labels=()) -> Counter:
+        return self._get(Counter, name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, labels, buckets)
+
+    def callback(self, name, help, fn, type="gauge", labels=()) -> Callback:
+        """Метрика из существующих stats(); повторная регистрация заменяет fn"""
+        self._metrics[name] = Callback(name, help, type, labels, fn)
+        return self._metrics[name]
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            samples = metric.render()
+            if samples:
+                lines += metric.header() + samples
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+UPDATES = REGISTRY.histogram("bot_update_seconds", "Обработка апдейта целиком", ("type",))
+HANDLERS = REGISTRY.histogram("bot_handler_seconds", "Время хендлера", ("router", "handler"))
+HANDLER_ERRORS = REGISTRY.counter("bot_handler_errors_total", "Исключения в хендлерах", ("router", "handler"))
+DB_CALLS = REGISTRY.histogram("bot_db_seconds", "Время методов Database", ("method",))
+DB_ERRORS = REGISTRY.counter("bot_db_errors_total", "Исключения в методах Database", ("method",))
+API_CALLS = REGISTRY.histogram("bot_api_seconds", "Запросы к Bot API", ("method",))
+API_ERRORS = REGISTRY.counter("bot_api_errors_total", "Ошибки запросов к Bot API", ("method", "error"))
+
+
+# ===== Инструментирование =====
+
+def timed(histogram: Histogram, errors: Counter = None):
+    """Класс-декоратор: время каждого публичного async-метода с меткой по имени"""
+
+    def wrap(name, fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            except Exception:
+                if errors:
+                    errors.inc(name)
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started, name)
+        return wrapper
+
+    def decorate(cls):
+        for name, fn in list(vars(cls).items()):
+            if not name.startswith("_") and inspect.iscoroutinefunction(fn):
+                setattr(cls, name, wrap(name, fn))
+        return cls
+
+    return decorate
+
+
+async def update_middleware(handler, event, data):
+    """Outer middleware апдейтов: общее время по типу апдейта"""
+    with UPDATES.time(event.event_type):
+        return await handler(event, data)
+
+
+async def handler_middleware(handler, event, data):
+    """Inner middleware: к этому моменту фильтры выбрали хендлер"""
+    callback = data["handler"].callback
+    labels = (callback.__module__.rpartition(".")[2], callback.__name__)
+    started = time.perf_counter()
+    try:
+        return await handler(event, data)
+    except Exception:
+        HANDLER_ERRORS.inc(*labels)
+        raise
+    finally:
+        HANDLERS.observe(time.perf_counter() - started, *labels)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: время каждого вызова Bot API по методу"""
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            API_ERRORS.inc(name, type(e).__name__)
+            raise
+        finally:
+            API_CALLS.observe(time.perf_counter() - started, name)
+
+
+def setup(dp, bot):
+    """Подключить метрики к диспетчеру и сессии бота"""
+    dp.update.outer_middleware(update_middleware)
+    for name, observer in dp.observers.items():
+        if name not in ("update", "error"):
+            observer.middleware(handler_middleware)
+    bot.session.middleware(ApiMetricsMiddleware())
+
+
+def cache_metrics(caches: dict):
+    """Попадания в кэши: {имя: объект со stats() с hits / misses}"""
+    def requests():
+        values = {}
+        for name, cache in caches.items():
+            stats = cache.stats()
+            values[(name, "hit")] = stats["hits"]
+            values[(name, "miss")] = stats["misses"]
+        return values
+
+    REGISTRY.callback("bot_cache_requests_total", "Обращения к кэшам", requests,
+                      type="counter", labels=("cache", "result"))
+
+
+def component_metrics(scheduler=None, sender=None, supervisor=None, pool=None):
+    """Очереди и задержки фоновых компонентов (те, что есть в процессе)"""
+    if scheduler:
+        REGISTRY.callback("bot_reminders_scheduled", "Напоминаний в колесе таймеров",
+                          lambda: scheduler.stats()["scheduled"])
+        REGISTRY.callback("bot_reminders_inflight", "Напоминаний в очереди отправки",
+                          lambda: scheduler.stats()["inflight"])
+        REGISTRY.callback("bot_reminders_lag_seconds", "Опоздание напоминаний последнего окна",
+                          lambda: scheduler.lag)
+        REGISTRY.callback("bot_reminders_total", "Напоминания по исходу",
+                          lambda: {"sent": scheduler.sent, "dropped": scheduler.dropped},
+                          type="counter", labels=("result",))
+    if sender:
+        REGISTRY.callback("bot_send_queue_depth", "Сообщений в очереди отправки", lambda: sender.stats()["depth"])
+        REGISTRY.callback("bot_send_latency_p95_seconds", "p95 от постановки до отправки",
+                          lambda: sender.stats()["latency_p95"])
+        REGISTRY.callback("bot_send_total", "Исходящие сообщения по исходу",
+                          lambda: {k: sender.stats()[k] for k in ("sent", "failed", "retries", "dropped")},
+                          type="counter", labels=("result",))
+    if supervisor:
+        def workers(field):
+            return lambda: {str(w["index"]): int(w[field]) for w in supervisor.stats()["workers"]}
+        REGISTRY.callback("bot_worker_pending", "Апдейтов в работе у воркера", workers("pending"), labels=("worker",))
+        REGISTRY.callback("bot_worker_lag_seconds", "Возраст старейшего апдейта воркера",
+                          lambda: {str(w["index"]): w["lag_ms"] / 1000 for w in supervisor.stats()["workers"]},
+                          labels=("worker",))
+        REGISTRY.callback("bot_worker_up", "Воркер отвечает", workers("alive"), labels=("worker",))
+        REGISTRY.callback("bot_worker_restarts_total", "Перезапуски воркера", workers("restarts"),
+                          type="counter", labels=("worker",))
+    if pool:
+        REGISTRY.callback("bot_db_pool_wait_seconds_total", "Ожидание соединения из пула",
+                          lambda: pool.wait_time, type="counter")
+        REGISTRY.callback("bot_db_pool_in_use", "Занятых соединений", lambda: pool.in_use)
+
+
+# ===== HTTP =====
+
+async def serve(host: str, port: int):
+    """Поднять /metrics на отдельном порту; вернуть runner для cleanup()"""
+    async def handle(request):
+        return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики: http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,86 @@
+# utils/outbox.py
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _chat_id(value: str):
+    """chat_id хранится текстом: числовые id обратно в int, @username как есть"""
+    return int(value) if value.lstrip("-").isdigit() else value
+
+
+class OutboxRelay:
+    """Доставка уведомлений из таблицы outbox через SendQueue
+
+    Уведомления пишутся в outbox в одной транзакции с записью, поэтому
+    не теряются при сбое. Релей забирает их пачками (с арендой) и
+    отмечает отправленными только после доставки — at-least-once.
+    wake() будит релей сразу после новой записи, иначе опрос раз в interval.
+    """
+
+    PURGE_EVERY = 3600  # секунд между чистками отправленного и брошенного
+
+    def __init__(self, db, sender, interval: float = 5, batch: int = 50,
+                 max_attempts: int = 10, lease: int = 300):
+        self.db = db
+        self.sender = sender
+        self.interval = interval
+        self.batch = batch
+        self.max_attempts = max_attempts
+        self.lease = lease
+
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def wake(self):
+        self._wakeup.set()
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_purge = 0
+        while True:
+            try:
+                await self.flush()
+                if loop.time() >= next_purge:
+                    _, dropped = await self.db.purge_outbox(max_attempts=self.max_attempts)
+                    if dropped:
+                        logger.warning(f"Outbox: удалено {dropped} уведомлений, не доставленных "
+                                       f"за {self.max_attempts} попыток")
+                    next_purge = loop.time() + self.PURGE_EVERY
+            except Exception:
+                logger.exception("Outbox: ошибка доставки")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def flush(self):
+        """Передать в SendQueue всё, что можно взять в работу"""
+        while True:
+            rows = await self.db.claim_outbox(self.batch, self.max_attempts, self.lease)
+            for outbox_id, chat_id, text in rows:
+                self._send(outbox_id, chat_id, text)
+            if len(rows) < self.batch:
+                return
+
+    def _send(self, outbox_id, chat_id, text):
+        async def sent():
+            await self.db.mark_outbox_sent(outbox_id)
+
+        async def failed():
+            await self.db.release_outbox(outbox_id)
+
+        if not self.sender.send(_chat_id(chat_id), text, on_sent=sent, on_failed=failed, parse_mode="HTML"):
+            # Очередь переполнена — строка вернётся после истечения аренды
+            logger.warning(f"Outbox: уведомление {outbox_id} отложено")
@@ -1,57 +1,216 @@
 # utils/scheduler.py
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.date import DateTrigger
+import asyncio
+import logging
+import time
 from datetime import datetime, timedelta
 import pytz
 from config.settings import get_settings
+from keyboards.main import review_request_kb
+from utils.timing_wheel import TimingWheel
 
 settings = get_settings()
 tz = pytz.timezone(settings["TIMEZONE"])
+logger = logging.getLogger(__name__)
+
+
+# Заголовок сообщения по виду плана
+HEADERS = {
+    "reminder": "💅 <b>Напоминание</b>",
+    "review": "⭐ <b>Как всё прошло?</b>",
+}
+
+
+class _Fields(dict):
+    """Неизвестное поле в тексте плана остаётся как есть: «{name}»"""
+
+    def __missing__(self, key):
+        return "{" + key + "}"
 
 
 class ReminderScheduler:
-    def __init__(self, bot, db):
+    """Напоминания из таблицы reminder_tasks
+
+    Таблица — источник истины; на запись ставится по задаче на каждый
+    план из reminder_plans (за сутки, за 2 часа, просьба об отзыве...).
+    Задачи ближайших horizon секунд лежат в колесе таймеров
+    (TimingWheel): track/cancel — O(1). Дальние подгружаются окнами по
+    мере приближения, поэтому память ограничена горизонтом, а после
+    перезапуска всё продолжается с того же места. Раз в interval база
+    опрашивается и без колеса — на случай записей другого процесса.
+
+    Отправка идёт окнами: раз в window секунд из базы забирается не
+    больше rate * window наступивших задач, остальное — в следующее
+    окно. Утренний пик «завтрашних» напоминаний растягивается на
+    несколько минут вместо сотен сообщений разом.
+
+    Просроченные (например, за время простоя) задачи:
+    catch_up=True — отправить, если опоздали не больше grace (и визит
+    ещё впереди для напоминаний); catch_up=False — только вовремя.
+    """
+
+    def __init__(self, bot, db, sender, interval: float = 30, batch: int = 100, lease: int = 300,
+                 max_attempts: int = 5, catch_up: bool = True, grace: timedelta = timedelta(hours=12),
+                 horizon: float = 6 * 3600, tick: float = 1.0, window: float = 60, rate: float = 5):
         self.bot = bot
         self.db = db
-        self.scheduler = AsyncIOScheduler(timezone=tz)
-        self.jobs = {}
+        self.sender = sender
+        self.interval = interval
+        self.batch = batch
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.catch_up = catch_up
+        self.grace = grace
+        self.horizon = horizon
+        self.tick = tick
+        self.window = window
+        self.window_budget = max(1, int(rate * window))
+
+        self.wheel = None
+        self._loaded_until = None  # до какого времени задачи уже в колесе
+        self._by_booking = {}  # booking_id -> {(booking_id, task_id)} в колесе
+        self._inflight = set()  # task_id, отданные в SendQueue
+        self._task = None
+
+        self.sent = 0
+        self.dropped = 0
+        self.lag = 0.0  # опоздание самой поздней задачи последнего окна, секунды
 
     async def start(self):
-        self.scheduler.start()
-        # Восстановление задач после перезапуска
-        pending = await self.db.get_pending_reminders()
-        for bid, uid, name, svc, date, time, remind_at in pending:
-            dt = datetime.fromisoformat(remind_at)
-            if dt > datetime.now(tz):
-                self._schedule(bid, uid, name, svc, date, time, dt)
-
-    def _schedule(self, bid, uid, name, svc, date, time, remind_at):
-        async def send():
-            try:
-                text = settings["REMINDER_TEXT"].format(service=svc or "процедуру", time=time)
-                await self.bot.send_message(uid, f"💅 <b>Напоминание</b>\n\n{text}", parse_mode="HTML")
-                await self.db.mark_reminder_sent(bid)
-            except Exception as e:
-                print(f"Reminder error: {e}")
-
-        job = self.scheduler.add_job(send, trigger=DateTrigger(run_date=remind_at),
-                                    id=f"rem_{bid}", replace_existing=True)
-        self.jobs[bid] = job.id
-
-    async def add(self, bid, uid, name, svc, date, time, appt_dt):
-        remind_at = appt_dt - timedelta(hours=24)
-        if remind_at <= datetime.now(tz):
-            return
-        await self.db.add_reminder_task(bid, remind_at.isoformat())
-        self._schedule(bid, uid, name, svc, date, time, remind_at)
+        self.wheel = TimingWheel(time.time(), self.tick)
+        await self._load()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def track(self, bid, reminders):
+        """Задачи новой записи: [(task_id, remind_at)]; дальние подгрузит _load"""
+        for task_id, remind_at in reminders or ():
+            if remind_at.timestamp() <= self._loaded_until:
+                self._insert(bid, task_id, remind_at.timestamp())
 
     def cancel(self, bid):
-        if bid in self.jobs:
+        for key in self._by_booking.pop(bid, ()):
+            self.wheel.cancel(key)
+
+    def _insert(self, bid, task_id, due: float):
+        key = (bid, task_id)
+        self.wheel.insert(key, due)
+        self._by_booking.setdefault(bid, set()).add(key)
+
+    async def _run(self):
+        next_poll = 0
+        next_window = 0
+        pending = False
+        while True:
+            now = time.time()
             try:
-                self.scheduler.remove_job(self.jobs[bid])
-            except:
-                pass
-            del self.jobs[bid]
+                for bid, task_id in self.wheel.advance(now):
+                    keys = self._by_booking.get(bid)
+                    if keys is not None:
+                        keys.discard((bid, task_id))
+                        if not keys:
+                            del self._by_booking[bid]
+                    pending = True
+                if now >= next_poll:
+                    pending = True
+                    next_poll = now + self.interval
+                if pending and now >= next_window:
+                    pending = await self.dispatch()
+                    next_window = now + self.window
+                if now + self.horizon / 2 >= self._loaded_until:
+                    await self._load()
+            except Exception:
+                logger.exception("Напоминания: ошибка цикла")
+            await asyncio.sleep(self.tick - time.time() % self.tick)
+
+    async def _load(self):
+        """Положить в колесо задачи до now + horizon, которых там ещё нет"""
+        until = time.time() + self.horizon
+        start = datetime.fromtimestamp(self._loaded_until, tz).isoformat() if self._loaded_until else ""
+        rows = await self.db.get_reminders_between(start, datetime.fromtimestamp(until, tz).isoformat())
+        for task_id, bid, remind_at in rows:
+            self._insert(bid, task_id, datetime.fromisoformat(remind_at).timestamp())
+        self._loaded_until = until
+
+    async def dispatch(self) -> bool:
+        """Одно окно: забрать не больше window_budget наступивших задач
+
+        Возвращает True, если бюджет кончился и в базе могли остаться
+        наступившие задачи — их заберёт следующее окно.
+        """
+        snapshot = await self.db.catalog.get()
+        budget = self.window_budget
+        while budget > 0 and len(self._inflight) < self.batch:
+            limit = min(budget, self.batch - len(self._inflight))
+            rows = await self.db.claim_due_reminders(limit, self.lease, self.max_attempts)
+            budget -= len(rows)
+            now = datetime.now(tz)
+            self.lag = max((now - datetime.fromisoformat(row[7]) for row in rows), default=timedelta()).total_seconds()
+            for task_id, bid, plan_id, uid, svc, date, time_, remind_at in rows:
+                if task_id in self._inflight:
+                    # Аренда истекла, пока сообщение ждёт в очереди отправки
+                    continue
+                plan = snapshot.plans.get(plan_id)
+                if plan_id is not None and not plan:
+                    # План выключен после записи — его задачи не отправляем
+                    self.dropped += 1
+                    logger.info(f"Напоминание {task_id} пропущено: план {plan_id} выключен")
+                    await self.db.drop_reminder(task_id)
+                    continue
+                kind, text = (plan[4], plan[5]) if plan else ("reminder", settings["REMINDER_TEXT"])
+                if self._expired(now, kind, date, time_, remind_at):
+                    self.dropped += 1
+                    logger.info(f"Напоминание {task_id} пропущено: опоздали ({remind_at})")
+                    await self.db.drop_reminder(task_id)
+                    continue
+                try:
+                    body = text.format_map(_Fields(service=svc or "процедуру", date=date, time=time_))
+                except (ValueError, IndexError, KeyError, AttributeError, TypeError) as e:
+                    # Текст плана правит админ: «{}» или непарная скобка ломают
+                    # только эту задачу, а не всё окно
+                    self.dropped += 1
+                    logger.error(f"Напоминание {task_id}: не удалось подставить поля в текст плана {plan_id}: {e}")
+                    await self.db.drop_reminder(task_id)
+                    continue
+                self._send(task_id, bid, uid, kind, body)
+            if len(rows) < limit:
+                return False
+        return True
+
+    def _expired(self, now, kind, date, time_, remind_at) -> bool:
+        if kind == "reminder":
+            appt = tz.localize(datetime.strptime(f"{date} {time_}", "%Y-%m-%d %H:%M"))
+            if appt <= now:
+                return True
+        late = now - datetime.fromisoformat(remind_at)
+        limit = self.grace if self.catch_up else timedelta(seconds=2 * self.interval + self.window)
+        return late > limit
+
+    def _send(self, task_id, bid, uid, kind, text):
+        async def sent():
+            self._inflight.discard(task_id)
+            self.sent += 1
+            await self.db.mark_reminder_sent(task_id, bid)
+
+        async def failed():
+            self._inflight.discard(task_id)
+            await self.db.release_reminder(task_id)
+
+        header = HEADERS.get(kind, HEADERS["reminder"])
+        kwargs = {"reply_markup": review_request_kb()} if kind == "review" else {}
+        if self.sender.send(uid, f"{header}\n\n{text}", on_sent=sent, on_failed=failed,
+                            parse_mode="HTML", **kwargs):
+            self._inflight.add(task_id)
 
-    def shutdown(self):
-        self.scheduler.shutdown()
+    def stats(self):
+        return {
+            "scheduled": len(self.wheel) if self.wheel else 0,
+            "inflight": len(self._inflight),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "lag": round(self.lag, 3),
+        }
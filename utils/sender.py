@@ -0,0 +1,182 @@
+# utils/sender.py
+import asyncio
+import logging
+import time
+from collections import deque
+from aiogram.exceptions import TelegramRetryAfter, TelegramNetworkError, TelegramAPIError
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """rate токенов в секунду, не больше capacity про запас"""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Забрать токен в долг; вернуть, сколько секунд ждать до его погашения
+
+        Долг копится в tokens < 0, поэтому резервирующие по очереди
+        получают токены в том же порядке (FIFO внутри чата).
+        """
+        self._refill()
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0
+        return -self.tokens / self.rate
+
+    @property
+    def full(self):
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class SendQueue:
+    """Очередь исходящих сообщений с ограничением скорости
+
+    Лимиты Telegram: общий на бота (global_rate в секунду), на личный чат
+    (chat_rate) и на группу/канал (group_rate). send() кладёт сообщение
+    в очередь и сразу возвращается; отправляют воркеры. RetryAfter
+    ставит на паузу всю очередь, сетевые ошибки повторяются с backoff.
+    """
+
+    MAX_CHAT_BUCKETS = 10000
+
+    def __init__(self, bot, global_rate: float = 25, chat_rate: float = 1, group_rate: float = 20 / 60,
+                 workers: int = 4, max_retries: int = 5, max_size: int = 10000):
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.workers = workers
+        self.max_retries = max_retries
+
+        self._queue = asyncio.Queue(maxsize=max_size)
+        self._global = TokenBucket(global_rate, capacity=global_rate)
+        self._chats = {}  # chat_id -> TokenBucket
+        self._paused_until = 0.0
+        self._tasks = []
+
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.dropped = 0
+        self._latencies = deque(maxlen=1000)
+
+    def send(self, chat_id, text: str, on_sent=None, on_failed=None, **kwargs) -> bool:
+        """Поставить сообщение в очередь
+
+        on_sent / on_failed — корутины-функции после успешной отправки
+        или окончательной неудачи.
+        """
+        try:
+            self._queue.put_nowait((time.monotonic(), chat_id, text, kwargs, on_sent, on_failed))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Очередь отправки переполнена, сообщение для {chat_id} отброшено")
+            return False
+        self.enqueued += 1
+        return True
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10):
+        """Дождаться отправки очереди (не дольше timeout) и остановить воркеры"""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Очередь отправки: не отправлено {self._queue.qsize()} сообщений")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self):
+        while True:
+            item = await self._queue.get()
+            try:
+                await self._deliver(*item)
+            except Exception:
+                logger.exception("Очередь отправки: ошибка воркера")
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, enqueued_at, chat_id, text, kwargs, on_sent, on_failed):
+        attempt = 0
+        while True:
+            await self._acquire(chat_id)
+            try:
+                await self.bot.send_message(chat_id, text, **kwargs)
+            except TelegramRetryAfter as e:
+                # Flood control — пауза для всей очереди
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+                logger.warning(f"RetryAfter {e.retry_after}s для {chat_id}")
+            except TelegramNetworkError as e:
+                await asyncio.sleep(min(30, 0.5 * 2 ** attempt))
+                logger.warning(f"Сетевая ошибка при отправке {chat_id}: {e}")
+            except TelegramAPIError as e:
+                # Заблокировал бота, неверный чат и т.п. — повтор не поможет
+                self.failed += 1
+                logger.warning(f"Не отправлено {chat_id}: {e}")
+                if on_failed:
+                    await on_failed()
+                return
+            else:
+                self.sent += 1
+                self._latencies.append(time.monotonic() - enqueued_at)
+                if on_sent:
+                    await on_sent()
+                return
+
+            attempt += 1
+            if attempt > self.max_retries:
+                self.failed += 1
+                logger.error(f"Не отправлено {chat_id}: исчерпаны повторы")
+                if on_failed:
+                    await on_failed()
+                return
+            self.retries += 1
+
+    async def _acquire(self, chat_id):
+        """Дождаться токена в общем ведре и в ведре чата"""
+        wait = max(self._global.reserve(), self._chat_bucket(chat_id).reserve())
+        if wait > 0:
+            await asyncio.sleep(wait)
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.MAX_CHAT_BUCKETS:
+                # Полные вёдра ничего не помнят — их можно выбросить
+                self._chats = {cid: b for cid, b in self._chats.items() if not b.full}
+            # Личные чаты — положительный id; группы, каналы и @username — нет
+            private = isinstance(chat_id, int) and chat_id > 0
+            bucket = TokenBucket(self.chat_rate if private else self.group_rate)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def stats(self):
+        latencies = sorted(self._latencies)
+        return {
+            "depth": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "dropped": self.dropped,
+            "latency_avg": round(sum(latencies) / len(latencies), 3) if latencies else 0,
+            "latency_p95": round(latencies[int(len(latencies) * 0.95)], 3) if latencies else 0,
+        }
@@ -0,0 +1,84 @@
+# utils/subscription.py
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBED_STATUSES = ("member", "administrator", "creator")
+
+
+class SubscriptionCache:
+    """Кэш статуса подписки на канал
+
+    Положительный и отрицательный ответ живут разное время (TTL).
+    Одновременные проверки одного пользователя склеиваются в один
+    вызов get_chat_member (single-flight).
+    """
+
+    def __init__(self, channel_id, positive_ttl: float = 600, negative_ttl: float = 15, max_size: int = 50000):
+        self.channel_id = channel_id
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+
+        self._entries = {}   # user_id -> (subscribed, expires_at)
+        self._inflight = {}  # user_id -> Future
+
+        self.hits = 0
+        self.misses = 0
+        self.api_calls = 0
+        self.errors = 0
+
+    async def is_subscribed(self, bot, user_id: int, force: bool = False) -> bool:
+        """Подписан ли пользователь; force=True — всегда спросить Telegram"""
+        if not force:
+            entry = self._entries.get(user_id)
+            if entry and entry[1] > time.monotonic():
+                self.hits += 1
+                return entry[0]
+        self.misses += 1
+
+        future = self._inflight.get(user_id)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(bot, user_id))
+            self._inflight[user_id] = future
+            future.add_done_callback(lambda _: self._inflight.pop(user_id, None))
+        return await asyncio.shield(future)
+
+    async def _fetch(self, bot, user_id: int) -> bool:
+        self.api_calls += 1
+        try:
+            member = await bot.get_chat_member(self.channel_id, user_id)
+        except Exception as e:
+            # Ошибку не кэшируем — следующий запрос спросит снова
+            self.errors += 1
+            logger.warning(f"Subscription check error: {e}")
+            return False
+
+        subscribed = member.status in SUBSCRIBED_STATUSES
+        ttl = self.positive_ttl if subscribed else self.negative_ttl
+        if len(self._entries) >= self.max_size:
+            self._evict()
+        self._entries[user_id] = (subscribed, time.monotonic() + ttl)
+        return subscribed
+
+    def _evict(self):
+        now = time.monotonic()
+        self._entries = {uid: e for uid, e in self._entries.items() if e[1] > now}
+        if len(self._entries) >= self.max_size:
+            self._entries.clear()
+
+    def invalidate(self, user_id: int):
+        self._entries.pop(user_id, None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0,
+            "api_calls": self.api_calls,
+            "errors": self.errors,
+        }
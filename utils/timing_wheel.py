@@ -0,0 +1,93 @@
+# utils/timing_wheel.py
+import math
+
+
+class TimingWheel:
+    """Иерархическое колесо таймеров
+
+    Уровень 0 — size[0] ячеек по одному тику, уровень i — ячейки шириной
+    size[0] * ... * size[i-1] тиков. Ключ кладётся на самый мелкий уровень,
+    куда дотягивается его срок; когда колесо доходит до ячейки верхнего
+    уровня, её ключи опускаются ниже. Сроки дальше всего колеса ждут
+    в overflow и разбираются при полном обороте.
+
+    insert / cancel — O(1) по ключу, advance — O(тиков + сработавших).
+    """
+
+    def __init__(self, now: float, tick: float = 1.0, sizes: tuple = (60, 60, 24)):
+        self.tick = tick
+        self.sizes = sizes
+        self.widths = [math.prod(sizes[:i]) for i in range(len(sizes))]
+        self.span = math.prod(sizes)
+
+        self._levels = [[{} for _ in range(size)] for size in sizes]
+        self._overflow = {}  # key -> due_tick
+        self._where = {}     # key -> (level, slot); level -1 — overflow
+        self._now = int(now // tick)
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, key):
+        return key in self._where
+
+    def insert(self, key, due: float):
+        """Поставить (или переставить) ключ на время due"""
+        self.cancel(key)
+        # Текущий тик уже обработан — раньше следующего не сработает
+        self._place(key, max(math.ceil(due / self.tick), self._now + 1))
+
+    def cancel(self, key) -> bool:
+        where = self._where.pop(key, None)
+        if where is None:
+            return False
+        level, slot = where
+        if level < 0:
+            del self._overflow[key]
+        else:
+            del self._levels[level][slot][key]
+        return True
+
+    def _place(self, key, due_tick: int):
+        delta = due_tick - self._now
+        for level, width in enumerate(self.widths):
+            if delta < width * self.sizes[level]:
+                slot = (due_tick // width) % self.sizes[level]
+                self._levels[level][slot][key] = due_tick
+                self._where[key] = (level, slot)
+                return
+        self._overflow[key] = due_tick
+        self._where[key] = (-1, None)
+
+    def advance(self, now: float) -> list:
+        """Довести колесо до now; вернуть ключи, чей срок наступил"""
+        target = int(now // self.tick)
+        fired = []
+        while self._now < target:
+            self._now += 1
+            if self._now % self.span == 0 and self._overflow:
+                self._cascade(self._overflow)
+            for level in range(len(self.sizes) - 1, 0, -1):
+                width = self.widths[level]
+                if self._now % width == 0:
+                    slot = (self._now // width) % self.sizes[level]
+                    bucket = self._levels[level][slot]
+                    if bucket:
+                        self._levels[level][slot] = {}
+                        self._cascade(bucket)
+            slot = self._now % self.sizes[0]
+            bucket = self._levels[0][slot]
+            if bucket:
+                self._levels[0][slot] = {}
+                for key in bucket:
+                    del self._where[key]
+                fired.extend(bucket)
+        return fired
+
+    def _cascade(self, bucket: dict):
+        items = list(bucket.items())
+        bucket.clear()
+        for key, due_tick in items:
+            del self._where[key]
+            # Ячейка уровня 0 для текущего тика ещё не обработана
+            self._place(key, max(due_tick, self._now))
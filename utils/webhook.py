@@ -0,0 +1,103 @@
+# utils/webhook.py
+import asyncio
+import hmac
+import logging
+from aiohttp import web
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """Приём обновлений через webhook (aiohttp)
+
+    Запрос проверяется по секретному токену и сразу получает 200,
+    обработка идёт в фоне: одновременно не больше max_concurrency
+    апдейтов. Если в очереди уже max_pending — отвечаем 503,
+    и Telegram повторит доставку позже (backpressure).
+    """
+
+    def __init__(self, dp, bot, path: str, secret: str,
+                 max_concurrency: int = 32, max_pending: int = 256):
+        if not secret:
+            raise ValueError("WEBHOOK_SECRET обязателен в режиме webhook")
+        self.dp = dp
+        self.bot = bot
+        self.path = path
+        self.secret = secret
+        self.max_pending = max_pending
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks = set()
+
+        self.app = web.Application()
+        self.app.router.add_post(path, self.handle)
+
+        self.received = 0
+        self.rejected = 0
+        self.failed = 0
+
+    @property
+    def pending(self):
+        return len(self._tasks)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        token = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token, self.secret):
+            return web.Response(status=401)
+
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            return web.Response(status=503)
+
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception as e:
+            logger.warning(f"Webhook: неверный апдейт: {e}")
+            return web.Response(status=400)
+
+        self.received += 1
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update: Update):
+        async with self._semaphore:
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception:
+                self.failed += 1
+                logger.exception(f"Webhook: ошибка обработки апдейта {update.update_id}")
+
+    async def run(self, host: str, port: int, url: str = ""):
+        """Поднять сервер и ждать до отмены; url — публичный адрес для set_webhook"""
+        runner = web.AppRunner(self.app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+
+        if url:
+            await self.bot.set_webhook(
+                url.rstrip("/") + self.path,
+                secret_token=self.secret,
+                allowed_updates=self.dp.resolve_used_update_types(),
+            )
+        logger.info(f"Webhook слушает {host}:{port}{self.path}")
+
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+            # Дорабатываем уже принятые апдейты
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self):
+        return {
+            "received": self.received,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "pending": self.pending,
+        }
@@ -0,0 +1,368 @@
+# utils/workers.py
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+# Апдейт с длинным текстом и entities легко больше 64 КБ по умолчанию
+MAX_LINE = 4 * 2**20
+
+
+def _encode(msg: dict) -> bytes:
+    return (json.dumps(msg, ensure_ascii=False) + "\n").encode()
+
+
+# ===== Супервизор =====
+
+class _Worker:
+    def __init__(self, index: int):
+        self.index = index
+        self.proc = None
+        self.ready = asyncio.Event()
+        self.pending = {}  # update id -> (future, отправлен в)
+        self.reader = None
+
+        self.processed = 0
+        self.lost = 0
+        self.restarts = 0
+        self.latency = 0.0
+        self.spawned_at = 0.0
+        self.last_pong = 0.0
+        self.health = {}
+
+    def lag(self, now: float) -> float:
+        """Возраст самого старого необработанного апдейта"""
+        return now - min(started for _, started in self.pending.values()) if self.pending else 0.0
+
+
+class Supervisor:
+    """N процессов-воркеров, апдейты распределяются по user_id
+
+    Супервизор получает апдейты (polling или webhook) и пересылает их
+    воркеру user_id % N, поэтому FSM-состояние и кэши пользователя живут
+    в одном процессе. Обмен — JSON-строки через stdin/stdout воркера.
+
+    Напоминания, outbox и очередь отправки работают только здесь:
+    воркеры присылают track / cancel / wake / send. Изменения справочников
+    и чёрного списка рассылаются остальным воркерам. Раз в health_interval
+    воркеры отвечают на ping; зависший (нет ответа 3 интервала после
+    ready или не поднявшийся за STARTUP_TIMEOUT) или упавший процесс
+    перезапускается.
+    """
+
+    STARTUP_TIMEOUT = 120  # секунд на импорт и подключение к базе
+
+    def __init__(self, count: int, argv: list, db, scheduler, outbox, sender, health_interval: float = 30):
+        self.argv = argv
+        self.db = db
+        self.scheduler = scheduler
+        self.outbox = outbox
+        self.sender = sender
+        self.health_interval = health_interval
+
+        self._workers = [_Worker(i) for i in range(count)]
+        self._ids = itertools.count(1)
+        self._health_task = None
+        self._stopping = False
+
+    async def start(self):
+        for worker in self._workers:
+            await self._spawn(worker)
+        self._health_task = asyncio.create_task(self._health())
+
+    async def stop(self, timeout: float = 15):
+        """Закрыть stdin воркеров — они дорабатывают принятое и выходят"""
+        self._stopping = True
+        if self._health_task:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+        for worker in self._workers:
+            if worker.proc and worker.proc.returncode is None:
+                worker.proc.stdin.close()
+        for worker in self._workers:
+            if not worker.proc:
+                continue
+            try:
+                await asyncio.wait_for(worker.proc.wait(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Воркер {worker.index} не остановился за {timeout}s")
+                worker.proc.kill()
+            if worker.reader:
+                await asyncio.gather(worker.reader, return_exceptions=True)
+
+    async def _spawn(self, worker: _Worker):
+        worker.proc = await asyncio.create_subprocess_exec(
+            *self.argv, str(worker.index),
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, limit=MAX_LINE,
+        )
+        worker.spawned_at = time.monotonic()
+        worker.reader = asyncio.create_task(self._read(worker))
+
+    async def route(self, key: int, update: Update) -> bool:
+        """Передать апдейт воркеру key % N и дождаться обработки"""
+        worker = self._workers[key % len(self._workers)]
+        await worker.ready.wait()
+        update_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        worker.pending[update_id] = (future, time.monotonic())
+        try:
+            worker.proc.stdin.write(_encode({
+                "op": "update", "id": update_id,
+                "update": update.model_dump(mode="json", by_alias=True, exclude_unset=True),
+            }))
+            await worker.proc.stdin.drain()
+        except (ConnectionError, RuntimeError) as e:
+            worker.pending.pop(update_id, None)
+            worker.lost += 1
+            logger.warning(f"Воркер {worker.index} недоступен, апдейт {update.update_id} потерян: {e}")
+            return False
+        return await future
+
+    def _post(self, worker: _Worker, msg: dict):
+        if worker.proc and worker.proc.returncode is None and not worker.proc.stdin.is_closing():
+            worker.proc.stdin.write(_encode(msg))
+
+    async def _read(self, worker: _Worker):
+        stdout = worker.proc.stdout
+        while True:
+            try:
+                line = await stdout.readline()
+            except ValueError:
+                logger.error(f"Воркер {worker.index}: слишком длинное сообщение")
+                continue
+            if not line:
+                break
+            try:
+                await self._handle(worker, json.loads(line))
+            except Exception:
+                logger.exception(f"Воркер {worker.index}: ошибка обработки сообщения")
+
+        await worker.proc.wait()
+        worker.ready.clear()
+        for future, _ in worker.pending.values():
+            if not future.done():
+                future.set_result(False)
+                worker.lost += 1
+        worker.pending.clear()
+        if self._stopping:
+            return
+        worker.restarts += 1
+        logger.error(f"Воркер {worker.index} завершился с кодом {worker.proc.returncode}, перезапуск")
+        await asyncio.sleep(1)
+        await self._spawn(worker)
+
+    async def _handle(self, worker: _Worker, msg: dict):
+        op = msg["op"]
+        if op == "done":
+            entry = worker.pending.pop(msg["id"], None)
+            if entry:
+                future, started = entry
+                worker.processed += 1
+                worker.latency += time.monotonic() - started
+                if not future.done():
+                    future.set_result(msg["ok"])
+        elif op == "track":
+            self.scheduler.track(msg["bid"], [(tid, datetime.fromisoformat(at)) for tid, at in msg["reminders"]])
+        elif op == "cancel":
+            self.scheduler.cancel(msg["bid"])
+        elif op == "wake":
+            self.outbox.wake()
+        elif op == "send":
+            self.sender.send(msg["chat_id"], msg["text"], **msg["kwargs"])
+        elif op == "invalidate":
+            await self.db.apply_change(msg["what"])
+            for other in self._workers:
+                if other is not worker:
+                    self._post(other, msg)
+        elif op == "ready":
+            worker.last_pong = time.monotonic()
+            worker.ready.set()
+            logger.info(f"Воркер {worker.index} запущен, pid {worker.proc.pid}")
+        elif op == "pong":
+            worker.last_pong = time.monotonic()
+            worker.health = msg["stats"]
+
+    async def _health(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            now = time.monotonic()
+            for worker in self._workers:
+                if not worker.proc or worker.proc.returncode is not None:
+                    continue
+                if not worker.ready.is_set():
+                    if now - worker.spawned_at > self.STARTUP_TIMEOUT:
+                        logger.error(f"Воркер {worker.index} не запустился, перезапуск")
+                        worker.proc.kill()
+                    continue
+                if now - worker.last_pong > 3 * self.health_interval:
+                    logger.error(f"Воркер {worker.index} не отвечает, перезапуск")
+                    worker.proc.kill()
+                    continue
+                self._post(worker, {"op": "ping"})
+            logger.info("Воркеры: " + "; ".join(
+                f"#{w['index']} pending={w['pending']} lag={w['lag_ms']}ms loop={w['loop_lag_ms']}ms "
+                f"done={w['processed']} restarts={w['restarts']}"
+                for w in self.stats()["workers"]
+            ))
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            "workers": [
+                {
+                    "index": w.index,
+                    "pid": w.proc.pid if w.proc else None,
+                    "alive": w.ready.is_set(),
+                    "pending": len(w.pending),
+                    "lag_ms": round(w.lag(now) * 1000, 1),
+                    "loop_lag_ms": w.health.get("loop_lag_ms", 0),
+                    "processed": w.processed,
+                    "latency_avg_ms": round(w.latency / w.processed * 1000, 1) if w.processed else 0,
+                    "lost": w.lost,
+                    "restarts": w.restarts,
+                    "last_pong_s": round(now - w.last_pong, 1),
+                    "health": w.health,
+                }
+                for w in self._workers
+            ],
+        }
+
+
+# ===== Воркер =====
+
+class _RemoteScheduler:
+    def __init__(self, link):
+        self._link = link
+
+    def track(self, bid, reminders):
+        self._link.post({"op": "track", "bid": bid,
+                         "reminders": [[tid, at.isoformat()] for tid, at in reminders or ()]})
+
+    def cancel(self, bid):
+        self._link.post({"op": "cancel", "bid": bid})
+
+
+class _RemoteOutbox:
+    def __init__(self, link):
+        self._link = link
+
+    def wake(self):
+        self._link.post({"op": "wake"})
+
+
+class _RemoteSender:
+    def __init__(self, link):
+        self._link = link
+
+    def send(self, chat_id, text: str, on_sent=None, on_failed=None, **kwargs) -> bool:
+        if on_sent or on_failed:
+            raise ValueError("Колбэки отправки недоступны в воркере")
+        self._link.post({"op": "send", "chat_id": chat_id, "text": text, "kwargs": kwargs})
+        return True
+
+
+class WorkerLink:
+    """Сторона воркера: апдейты из stdin, ответы и команды в stdout
+
+    scheduler / outbox / sender — заместители с тем же интерфейсом,
+    что и в однопроцессном режиме, работающие через супервизор.
+    """
+
+    LAG_PROBE = 0.5  # секунд между замерами задержки event loop
+
+    def __init__(self, index: int, db, concurrency: int = 64):
+        self.index = index
+        self.db = db
+        self.scheduler = _RemoteScheduler(self)
+        self.outbox = _RemoteOutbox(self)
+        self.sender = _RemoteSender(self)
+
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks = set()
+        self._reader = None
+        self._writer = None
+        self._loop_lag = 0.0
+
+        self.processed = 0
+        self.failed = 0
+
+        db.on_change = lambda what: self.post({"op": "invalidate", "what": what})
+
+    async def open(self):
+        loop = asyncio.get_running_loop()
+        # Протокол идёт через копию stdout; случайный print() уйдёт в stderr
+        out = os.fdopen(os.dup(sys.stdout.fileno()), "wb", buffering=0)
+        os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+        self._reader = asyncio.StreamReader(limit=MAX_LINE)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(self._reader), sys.stdin)
+        transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, out)
+        self._writer = asyncio.StreamWriter(transport, protocol, None, loop)
+
+    def post(self, msg: dict):
+        self._writer.write(_encode(msg))
+
+    async def serve(self, dp, bot, stats=None):
+        """Обрабатывать апдейты до закрытия stdin, затем доработать принятые"""
+        probe = asyncio.create_task(self._probe_lag())
+        self.post({"op": "ready"})
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                msg = json.loads(line)
+                op = msg["op"]
+                if op == "update":
+                    task = asyncio.create_task(self._process(dp, bot, msg))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                elif op == "invalidate":
+                    await self.db.apply_change(msg["what"])
+                elif op == "ping":
+                    self.post({"op": "pong", "stats": self.stats(stats)})
+                    self._loop_lag = 0.0
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            await self._writer.drain()
+        finally:
+            probe.cancel()
+
+    async def _process(self, dp, bot, msg: dict):
+        ok = True
+        async with self._semaphore:
+            try:
+                update = Update.model_validate(msg["update"], context={"bot": bot})
+                await dp.feed_update(bot, update)
+                self.processed += 1
+            except Exception:
+                ok = False
+                self.failed += 1
+                logger.exception(f"Воркер {self.index}: ошибка обработки апдейта")
+        self.post({"op": "done", "id": msg["id"], "ok": ok})
+
+    async def _probe_lag(self):
+        """Наибольшее опоздание пробуждения между ping — загрузка event loop"""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.LAG_PROBE)
+            self._loop_lag = max(self._loop_lag, loop.time() - started - self.LAG_PROBE)
+
+    def stats(self, extra=None):
+        return {
+            "pid": os.getpid(),
+            "loop_lag_ms": round(self._loop_lag * 1000, 1),
+            "inflight": len(self._tasks),
+            "processed": self.processed,
+            "failed": self.failed,
+            **(extra() if extra else {}),
+        }